@@ -0,0 +1,161 @@
+import graphene
+from asgiref.sync import sync_to_async
+
+from . import pubsub, search, stats
+from .loaders import AsyncLoaders
+from .models import User, Contract
+from .pagination import aconnection_from_queryset
+from .planner import plan_queryset
+from .result_cache import cached_field
+from .schema import (
+    ContractConnection,
+    ContractSort,
+    ContractType,
+    Mutation,
+    Query,
+    UserConnection,
+    UserType,
+    _contract_dependencies,
+    contract_queryset,
+)
+
+
+class AsyncQuery(Query):
+    """``Query`` with resolvers on Django's async ORM.
+
+    Root fields return coroutines, so the executor runs sibling fields
+    concurrently, and nested ``user``/``contracts`` lookups go through the
+    request's ``AsyncLoaders``.
+    """
+
+    class Meta:
+        name = 'Query'
+
+    async def resolve_users_gql(self, info, **kwargs):
+        return [user async for user in plan_queryset(User.objects.all(), info)]
+
+    async def resolve_contracts_gql(self, info, filter=None, sort=None):
+        return [contract async for contract in plan_queryset(contract_queryset(filter, sort), info)]
+
+    async def resolve_users_connection_gql(self, info, first=None, after=None):
+        return await aconnection_from_queryset(UserConnection, User.objects.all(), info, first, after)
+
+    async def resolve_contracts_connection_gql(self, info, first=None, after=None, filter=None):
+        queryset = contract_queryset(filter, ContractSort.CREATED_AT_ASC)
+        return await aconnection_from_queryset(ContractConnection, queryset, info, first, after)
+
+    @cached_field(lambda user, id: [('user', id)])
+    async def resolve_get_user_gql(self, info, id):
+        try:
+            return await plan_queryset(User.objects.all(), info).aget(id=id)
+        except User.DoesNotExist:
+            return None
+
+    @cached_field(_contract_dependencies)
+    async def resolve_get_contract_gql(self, info, input):
+        try:
+            return await plan_queryset(Contract.objects.all(), info).aget(id=input.id)
+        except Contract.DoesNotExist:
+            return None
+
+    @cached_field(_contract_dependencies)
+    async def resolve_get_contract_without_nested_user_gql(self, info, input):
+        try:
+            return await plan_queryset(Contract.objects.all(), info).aget(id=input.id)
+        except Contract.DoesNotExist:
+            return None
+
+    @cached_field(lambda contracts, user_id, **kwargs: [('user', user_id)])
+    async def resolve_getContractsByUser(self, info, user_id, filter=None, sort=None):
+        queryset = plan_queryset(contract_queryset({**(filter or {}), 'user_id': user_id}, sort), info)
+        return [contract async for contract in queryset]
+
+    async def resolve_user_contract_stats(self, info, user_id=None):
+        return [row async for row in stats.user_stats(user_id)]
+
+    async def resolve_contract_stats_by_month(self, info, since=None, until=None):
+        return [row async for row in stats.monthly_stats(since, until)]
+
+    async def resolve_search_contracts(self, info, query, first=None, after=None):
+        return await sync_to_async(search.search_connection)(ContractConnection, info, query, first, after)
+
+
+def _in_thread(field):
+    # Mutations keep their synchronous code paths (transactions, on_commit
+    # hooks); the executor awaits them on Django's sync thread.
+    return graphene.Field(
+        field.type,
+        args=field.args,
+        resolver=sync_to_async(field.resolver),
+        description=field.description,
+    )
+
+
+AsyncMutation = type(
+    'AsyncMutation',
+    (graphene.ObjectType,),
+    {
+        'Meta': type('Meta', (), {'name': 'Mutation'}),
+        **{name: _in_thread(field) for name, field in Mutation._meta.fields.items()},
+    },
+)
+
+
+class ChangeAction(graphene.Enum):
+    CREATED = pubsub.CREATED
+    UPDATED = pubsub.UPDATED
+    DELETED = pubsub.DELETED
+
+
+class ContractChangedEvent(graphene.ObjectType):
+    action = ChangeAction(required=True)
+    contract_id = graphene.ID(required=True)
+    user_id = graphene.ID(required=True)
+    contract = graphene.Field(ContractType, description="The contract when the event is delivered; null once deleted.")
+
+    async def resolve_contract(self, info):
+        if self['action'] == pubsub.DELETED:
+            return None
+        return await plan_queryset(Contract.objects.filter(pk=self['contract_id']), info).afirst()
+
+
+class UserChangedEvent(graphene.ObjectType):
+    action = ChangeAction(required=True)
+    user_id = graphene.ID(required=True)
+    user = graphene.Field(UserType, description="The user when the event is delivered; null once deleted.")
+
+    async def resolve_user(self, info):
+        if self['action'] == pubsub.DELETED:
+            return None
+        return await plan_queryset(User.objects.filter(pk=self['user_id']), info).afirst()
+
+
+class Subscription(graphene.ObjectType):
+    """Change events published by the mutations once they commit.
+
+    Events carry ids only; the rows are loaded when each event is delivered,
+    with just the selected columns, and not at all if none are selected.
+    """
+
+    contract_changed = graphene.Field(ContractChangedEvent, user_id=graphene.ID())
+    user_changed = graphene.Field(UserChangedEvent, id=graphene.ID(required=True))
+
+    async def subscribe_contract_changed(root, info, user_id=None):
+        async for message in pubsub.get_backend().subscribe(pubsub.contract_channel(user_id)):
+            yield message
+
+    async def subscribe_user_changed(root, info, id):
+        async for message in pubsub.get_backend().subscribe(pubsub.user_channel(id)):
+            yield message
+
+    def resolve_contract_changed(self, info, user_id=None):
+        # Loaders live for one event; the next one must not see stale rows.
+        info.context.loaders = AsyncLoaders()
+        return self
+
+    def resolve_user_changed(self, info, id):
+        info.context.loaders = AsyncLoaders()
+        return self
+
+
+async_schema = graphene.Schema(query=AsyncQuery, mutation=AsyncMutation, subscription=Subscription)
@@ -0,0 +1,377 @@
+"""Scenarios and measurements for the ``benchmark_graphql`` command.
+
+Every ``Query`` and ``Mutation`` field has a scenario: a function that
+returns the ``(query, variables)`` of one request. Scenarios run untimed
+before their request, so mutations that consume rows (deletes) create them
+there.
+"""
+import json
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+
+from .models import Contract, User
+
+SCENARIOS = {}
+
+
+def scenario(field):
+    def register(func):
+        SCENARIOS[field] = func
+        return func
+    return register
+
+
+# The checked-in database, which benchmark seeding and mutations must not
+# write to.
+TRACKED_DATABASE = settings.BASE_DIR / 'db.sqlite3'
+
+
+def use_database(path=None):
+    """Point the default and replica connections at the SQLite file ``path``.
+
+    The file is created and migrated if needed. Without ``path`` the
+    configured database is kept, unless it is the checked-in one.
+    """
+    if path is None:
+        name = connections['default'].settings_dict['NAME']
+        if Path(name).resolve() == TRACKED_DATABASE.resolve():
+            raise ValueError(
+                f'Refusing to write benchmark data to the checked-in {TRACKED_DATABASE.name}; '
+                'pass --database or set DATABASE_NAME.'
+            )
+        return
+    for alias in ('default', 'replica'):
+        connections[alias].close()
+        connections[alias].settings_dict['NAME'] = path
+    call_command('migrate', verbosity=0)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux.
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+class BenchmarkData:
+    """Ids to address and unique values to write, shared by all workers."""
+
+    def __init__(self, seed=0, sample_size=10000):
+        self.random = random.Random(seed)
+        self.user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True)[:sample_size])
+        self.contract_ids = list(Contract.objects.order_by('pk').values_list('pk', flat=True)[:sample_size])
+        if not self.user_ids or not self.contract_ids:
+            raise ValueError('Seed users and contracts first (seed_benchmark_data).')
+        self._serial = count()
+        self._lock = threading.Lock()
+
+    def user_id(self):
+        with self._lock:
+            return self.random.choice(self.user_ids)
+
+    def contract_id(self):
+        with self._lock:
+            return self.random.choice(self.contract_ids)
+
+    def serial(self):
+        return next(self._serial)
+
+    def email(self):
+        return f'bench-{time.time_ns()}-{self.serial()}@example.com'
+
+
+# Queries
+
+@scenario('usersGql')
+def users(data):
+    return '{ usersGql { id name email } }', None
+
+
+@scenario('contractsGql')
+def contracts(data):
+    # Joining each row's user would put the unbounded list over the cost budget.
+    return (
+        'query($id: ID) { contractsGql(filter: {userId: $id}) { id amount fidelity } }',
+        {'id': data.user_id()},
+    )
+
+
+@scenario('usersConnectionGql')
+def users_connection(data):
+    return (
+        'query { usersConnectionGql(first: 50) { edges { node { id email contracts { amount } } } '
+        'pageInfo { endCursor hasNextPage } } }',
+        None,
+    )
+
+
+@scenario('contractsConnectionGql')
+def contracts_connection(data):
+    return (
+        'query { contractsConnectionGql(first: 50) { edges { node { id amount user { email } } } '
+        'pageInfo { endCursor hasNextPage } } }',
+        None,
+    )
+
+
+@scenario('getUserGql')
+def get_user(data):
+    return (
+        'query($id: ID!) { getUserGql(id: $id) { id name email contracts { id amount } } }',
+        {'id': data.user_id()},
+    )
+
+
+@scenario('getContractGql')
+def get_contract(data):
+    return (
+        'query($id: ID!) { getContractGql(input: {id: $id}) { id amount fidelity user { name email } } }',
+        {'id': data.contract_id()},
+    )
+
+
+@scenario('getContractWithoutNestedUserGql')
+def get_contract_without_nested_user(data):
+    return (
+        'query($id: ID!) { getContractWithoutNestedUserGql(input: {id: $id}) { id amount userId } }',
+        {'id': data.contract_id()},
+    )
+
+
+@scenario('getContractsByUser')
+def get_contracts_by_user(data):
+    return (
+        'query($id: ID!) { getContractsByUser(userId: $id) { id amount createdAt } }',
+        {'id': data.user_id()},
+    )
+
+
+@scenario('userContractStats')
+def user_contract_stats(data):
+    return (
+        'query($id: ID) { userContractStats(userId: $id) { contractCount amountSum latestCreatedAt } }',
+        {'id': data.user_id()},
+    )
+
+
+@scenario('contractStatsByMonth')
+def contract_stats_by_month(data):
+    return '{ contractStatsByMonth { month contractCount amountSum fidelityAvg } }', None
+
+
+@scenario('searchContracts')
+def search_contracts(data):
+    return (
+        'query($query: String!) { searchContracts(query: $query, first: 20) { edges { node { id description amount } } '
+        'pageInfo { endCursor hasNextPage } } }',
+        {'query': f'Contract {data.serial() % 1000}'},
+    )
+
+
+# Mutations
+
+@scenario('createUserGql')
+def create_user(data):
+    return (
+        'mutation($input: CreateUserInput!) { createUserGql(input: $input) { id message } }',
+        {'input': {'name': 'Bench User', 'email': data.email()}},
+    )
+
+
+@scenario('updateUserGql')
+def update_user(data):
+    return (
+        'mutation($input: UpdateUserInput!) { updateUserGql(input: $input) { user { id name } message } }',
+        {'input': {'id': data.user_id(), 'name': f'Bench User {data.serial()}'}},
+    )
+
+
+@scenario('deleteUserGql')
+def delete_user(data):
+    user = User.objects.create(name='Bench User', email=data.email())
+    return (
+        'mutation($id: ID!) { deleteUserGql(input: {id: $id}) { successDeletion message } }',
+        {'id': user.id},
+    )
+
+
+@scenario('createContractGql')
+def create_contract(data):
+    return (
+        'mutation($input: CreateContractInput!) { createContractGql(input: $input) { contract { id } message } }',
+        {'input': {'description': 'Bench contract', 'userId': data.user_id(), 'fidelity': 12, 'amount': 99.5}},
+    )
+
+
+@scenario('updateContractGql')
+def update_contract(data):
+    return (
+        'mutation($input: UpdateContractInput!) { updateContractGql(input: $input) { contract { id amount } message } }',
+        {'input': {'id': data.contract_id(), 'amount': float(data.serial() % 1000)}},
+    )
+
+
+@scenario('deleteContractGql')
+def delete_contract(data):
+    contract = Contract.objects.create(description='Bench contract', user_id=data.user_id(), fidelity=1, amount=1.0)
+    return (
+        'mutation($id: ID!) { deleteContractGql(input: {id: $id}) { successDeletion message } }',
+        {'id': contract.id},
+    )
+
+
+@scenario('createUsersBulk')
+def create_users_bulk(data):
+    return (
+        'mutation($input: [CreateUserInput!]!) { createUsersBulk(input: $input) { users { id } message } }',
+        {'input': [{'name': 'Bench User', 'email': data.email()} for _ in range(50)]},
+    )
+
+
+@scenario('createContractsBulk')
+def create_contracts_bulk(data):
+    return (
+        'mutation($input: [CreateContractInput!]!) { createContractsBulk(input: $input) { contracts { id } message } }',
+        {'input': [
+            {'description': 'Bench contract', 'userId': data.user_id(), 'fidelity': 6, 'amount': 10.0}
+            for _ in range(50)
+        ]},
+    )
+
+
+@scenario('updateContractsBulk')
+def update_contracts_bulk(data):
+    ids = {data.contract_id() for _ in range(50)}
+    return (
+        'mutation($input: [UpdateContractInput!]!) { updateContractsBulk(input: $input) { contracts { id } message } }',
+        {'input': [{'id': pk, 'amount': float(data.serial() % 1000)} for pk in ids]},
+    )
+
+
+@scenario('deleteContractsBulk')
+def delete_contracts_bulk(data):
+    user_id = data.user_id()
+    contracts = Contract.objects.bulk_create(
+        Contract(description='Bench contract', user_id=user_id, fidelity=1, amount=1.0) for _ in range(50)
+    )
+    return (
+        'mutation($input: [DeleteContractInput!]!) { deleteContractsBulk(input: $input) { deletedCount message } }',
+        {'input': [{'id': contract.id} for contract in contracts]},
+    )
+
+
+def missing_scenarios(schema):
+    """Names of ``Query``/``Mutation`` fields without a scenario."""
+    graphql_schema = schema.graphql_schema
+    fields = set(graphql_schema.query_type.fields)
+    if graphql_schema.mutation_type is not None:
+        fields |= set(graphql_schema.mutation_type.fields)
+    return sorted(fields - set(SCENARIOS))
+
+
+class _ClientTransport:
+    def __init__(self, path):
+        self.path = path
+        self.client = Client()
+
+    def post(self, body):
+        response = self.client.post(self.path, body, content_type='application/json')
+        return response.status_code, response.json()
+
+
+class _HttpTransport:
+    def __init__(self, url):
+        self.url = url
+
+    def post(self, body):
+        request = Request(self.url, body.encode(), {'Content-Type': 'application/json'})
+        with urlopen(request) as response:
+            return response.status, json.load(response)
+
+
+def run_scenario(name, data, requests, concurrency, path='/graphql/', url=None):
+    """Send ``requests`` operations of one scenario from ``concurrency`` workers.
+
+    Without ``url`` the requests go through Django's test client in this
+    process, so peak RSS includes the server side.
+    """
+    build = SCENARIOS[name]
+
+    def worker(share):
+        transport = _HttpTransport(url) if url else _ClientTransport(path)
+        latencies, queries, errors = [], [], 0
+        for _ in range(share):
+            query, variables = build(data)
+            body = json.dumps({'query': query, 'variables': variables})
+            start = time.perf_counter()
+            status, result = transport.post(body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200 or result.get('errors'):
+                errors += 1
+            queries.append(result.get('extensions', {}).get('sqlQueries', 0))
+        if concurrency > 1:
+            connections.close_all()
+        return latencies, queries, errors
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    if concurrency == 1:
+        chunks = [worker(requests)]
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            chunks = list(pool.map(worker, shares))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for chunk in chunks for latency in chunk[0]]
+    queries = [query_count for chunk in chunks for query_count in chunk[1]]
+    return {
+        'requests': requests,
+        'errors': sum(chunk[2] for chunk in chunks),
+        'throughput': round(requests / elapsed, 2),
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95Ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'sqlQueriesPerOp': round(sum(queries) / len(queries), 2),
+        'peakRssKb': peak_rss_kb(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return regressions of ``results`` against ``baseline``, as messages.
+
+    Throughput may drop and latency rise by ``tolerance`` (a fraction);
+    SQL queries per operation may not grow at all.
+    """
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']} < {previous['throughput']} req/s")
+        for key in ('p95Ms', 'p99Ms'):
+            if current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f'{name}: {key} {current[key]} > {previous[key]}')
+        if current['sqlQueriesPerOp'] > previous['sqlQueriesPerOp']:
+            regressions.append(
+                f"{name}: {current['sqlQueriesPerOp']} SQL queries per operation > {previous['sqlQueriesPerOp']}"
+            )
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{name}: {current['errors']} errors > {previous['errors']}")
+    return regressions
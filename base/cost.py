@@ -0,0 +1,134 @@
+from django.conf import settings
+from graphql import (
+    GraphQLError,
+    GraphQLIncludeDirective,
+    GraphQLSkipDirective,
+    get_named_type,
+    get_nullable_type,
+    is_composite_type,
+    is_list_type,
+)
+from graphql.execution.values import (
+    get_argument_values,
+    get_directive_values,
+    get_variable_values,
+)
+from graphql.language import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    OperationDefinitionNode,
+)
+from graphql.utilities import type_from_ast
+
+from .pagination import DEFAULT_PAGE_SIZE
+
+MAX_COST = getattr(settings, 'GRAPHQL_MAX_COST', 50000)
+MAX_DEPTH = getattr(settings, 'GRAPHQL_MAX_DEPTH', 10)
+MAX_BATCH_COST = getattr(settings, 'GRAPHQL_MAX_BATCH_COST', MAX_COST)
+LIST_SIZE = getattr(settings, 'GRAPHQL_COST_LIST_SIZE', 1000)
+LIST_SIZES = getattr(settings, 'GRAPHQL_COST_LIST_SIZES', {})
+FIELD_COSTS = getattr(settings, 'GRAPHQL_FIELD_COSTS', {})
+
+
+class _Analyzer:
+    def __init__(self, schema, fragments, variables):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables
+        self.depth = 0
+
+    def _included(self, node):
+        skip = get_directive_values(GraphQLSkipDirective, node, self.variables)
+        if skip and skip['if']:
+            return False
+        include = get_directive_values(GraphQLIncludeDirective, node, self.variables)
+        return not (include and not include['if'])
+
+    def _fields(self, parent_type, selection_set):
+        for selection in selection_set.selections:
+            if not self._included(selection):
+                continue
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments[selection.name.value]
+            else:
+                fragment = selection
+            fragment_type = parent_type
+            if fragment.type_condition is not None:
+                fragment_type = type_from_ast(self.schema, fragment.type_condition)
+            yield from self._fields(fragment_type, fragment.selection_set)
+
+    def cost(self, parent_type, selection_set, depth=1, page_size=None):
+        """Cost of one instance of ``parent_type`` selecting ``selection_set``.
+
+        Every object resolved costs 1 (or its ``GRAPHQL_FIELD_COSTS`` entry);
+        a list multiplies its items' cost by the field's ``first`` argument,
+        the enclosing connection's page size for ``edges``, or the expected
+        size from ``GRAPHQL_COST_LIST_SIZES`` for unbounded lists.
+        """
+        self.depth = max(self.depth, depth)
+        total = 0
+        for field_parent, node in self._fields(parent_type, selection_set):
+            name = node.name.value
+            if name.startswith('__') or name not in field_parent.fields:
+                continue
+            field = field_parent.fields[name]
+            field_type = get_named_type(field.type)
+            if not is_composite_type(field_type):
+                continue
+            coordinate = f'{field_parent.name}.{name}'
+
+            first = get_argument_values(field, node, self.variables).get('first')
+            if 'first' in field.args and first is None:
+                first = DEFAULT_PAGE_SIZE
+            item_cost = FIELD_COSTS.get(coordinate, 1)
+            item_cost += self.cost(field_type, node.selection_set, depth + 1, first)
+            if is_list_type(get_nullable_type(field.type)):
+                item_cost *= page_size or LIST_SIZES.get(coordinate, LIST_SIZE)
+            total += item_cost
+        return total
+
+
+def analyze(schema, document, operation_name=None, variables=None):
+    """Return ``(cost, depth)`` of the operation, or ``None`` if its variables are invalid."""
+    operation, fragments = None, {}
+    for definition in document.definitions:
+        if isinstance(definition, FragmentDefinitionNode):
+            fragments[definition.name.value] = definition
+        elif isinstance(definition, OperationDefinitionNode):
+            if operation_name is None or (definition.name and definition.name.value == operation_name):
+                operation = operation or definition
+    if operation is None:
+        return None
+
+    coerced = get_variable_values(schema, operation.variable_definitions, variables or {})
+    if isinstance(coerced, list):
+        return None
+
+    root_type = schema.get_root_type(operation.operation)
+    analyzer = _Analyzer(schema, fragments, coerced)
+    return analyzer.cost(root_type, operation.selection_set), analyzer.depth
+
+
+def check_cost(schema, document, operation_name=None, variables=None):
+    """Return ``(extensions, error)``; ``error`` is set when a budget is exceeded."""
+    analysis = analyze(schema, document, operation_name, variables)
+    if analysis is None:
+        return {}, None
+
+    cost, depth = analysis
+    extensions = {'cost': {'requested': cost, 'maximum': MAX_COST, 'depth': depth, 'maxDepth': MAX_DEPTH}}
+    if depth > MAX_DEPTH:
+        return extensions, GraphQLError(
+            f'Query depth {depth} exceeds the maximum of {MAX_DEPTH}.',
+            extensions={'code': 'QUERY_TOO_DEEP'},
+        )
+    if cost > MAX_COST:
+        return extensions, GraphQLError(
+            f'Query cost {cost} exceeds the maximum of {MAX_COST}.',
+            extensions={'code': 'QUERY_TOO_COSTLY'},
+        )
+    return extensions, None
@@ -0,0 +1,173 @@
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import sql
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    """Install ``wrapper`` as an execute wrapper on every connection."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield wrapper
+
+
+@asynccontextmanager
+async def awrap_queries(wrapper):
+    # Connections are per thread, and async ORM calls run on the request's
+    # sync thread, so the wrappers have to be installed from there.
+    wrapping = wrap_queries(wrapper)
+    await sync_to_async(wrapping.__enter__)()
+    try:
+        yield wrapper
+    finally:
+        await sync_to_async(wrapping.__exit__)(None, None, None)
+
+
+def count_queries():
+    return wrap_queries(QueryCounter())
+
+
+def acount_queries():
+    return awrap_queries(QueryCounter())
+
+
+class _Routing:
+    def __init__(self):
+        self.pinned = False
+
+
+# Mutable per-request state: sync_to_async copies the context into the ORM
+# thread, so pinning has to mutate the shared object, not reset the variable.
+_routing = ContextVar('db_routing', default=None)
+
+
+@contextmanager
+def request_routing():
+    """Route reads to the replica for the duration of a request."""
+    token = _routing.set(_Routing())
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def pin_primary():
+    """Send every read for the rest of the request to the primary."""
+    routing = _routing.get()
+    if routing is not None:
+        routing.pinned = True
+
+
+class ReadWriteRouter:
+    """Send reads inside a request to ``DATABASE_READ_REPLICA`` and writes to the primary.
+
+    Once a request writes (or starts a mutation) it is pinned to the primary,
+    so it reads its own writes. Reads outside a request, or inside a
+    transaction, stay on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(settings, 'DATABASE_READ_REPLICA', None)
+        routing = _routing.get()
+        if (
+            replica is None
+            or routing is None
+            or routing.pinned
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+# Single-statement writes. SQLite (3.35+) returns rows from INSERT, UPDATE
+# and DELETE, so a mutation does not need a read before or after its write.
+
+def _returning(model, connection):
+    return ', '.join(connection.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+
+
+def _raw(model, using, statement, params):
+    # RawQuerySet applies the backend's converters (e.g. datetimes); the list
+    # consumes the cursor so the statement completes.
+    return list(model._default_manager.db_manager(using).raw(statement, params))
+
+
+def update_returning(queryset, **values):
+    """``queryset.update(**values)`` that returns the updated instances."""
+    model = queryset.model
+    using = router.db_for_write(model)
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(values)
+    query.annotations = {}
+    statement, params = query.get_compiler(using).as_sql()
+    returning = _returning(model, connections[using])
+    return _raw(model, using, f'{statement} RETURNING {returning}', params)
+
+
+def delete_returning(queryset):
+    """Delete the rows of ``queryset`` in one statement and return them.
+
+    Unlike ``QuerySet.delete()`` there is no cascade collection and no
+    signals; callers handle dependent rows themselves.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    query = queryset.query.chain(sql.DeleteQuery)
+    statement, params = query.get_compiler(using).as_sql()
+    return _raw(model, using, f'{statement} RETURNING {_returning(model, connections[using])}', params)
+
+
+def insert_if_exists(instance, queryset):
+    """INSERT ``instance`` only if ``queryset`` has rows; return whether it did.
+
+    Used for foreign keys assigned by id: SQLite defers FK checks to the
+    commit, so the existence test is part of the INSERT itself.
+    """
+    model = type(instance)
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    values = [field.get_db_prep_save(field.pre_save(instance, True), connection) for field in fields]
+    condition, condition_params = queryset.query.get_compiler(using).as_sql()
+    statement = (
+        f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(quote(field.column) for field in fields)}) '
+        f'SELECT {", ".join(["%s"] * len(fields))} WHERE EXISTS ({condition}) '
+        f'RETURNING {quote(model._meta.pk.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(statement, [*values, *condition_params])
+        row = cursor.fetchone()
+    if row is None:
+        return False
+    for field in fields:
+        # As loaded from the database, e.g. an id given as a string is an int.
+        setattr(instance, field.attname, field.to_python(getattr(instance, field.attname)))
+    instance.pk = row[0]
+    instance._state.adding = False
+    instance._state.db = using
+    return True
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, parse
+from graphql.validation import validate
+
+DOCUMENT_CACHE_SIZE = getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 1000)
+PERSISTED_QUERY_CACHE = getattr(settings, 'GRAPHQL_PERSISTED_QUERY_CACHE', None)
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+documents = LRUCache(DOCUMENT_CACHE_SIZE)
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def persisted_query_hash(extensions):
+    persisted_query = (extensions or {}).get('persistedQuery') or {}
+    if persisted_query.get('version', 1) != 1:
+        raise GraphQLError(
+            'Unsupported persisted query version.',
+            extensions={'code': 'PERSISTED_QUERY_NOT_SUPPORTED'},
+        )
+    return persisted_query.get('sha256Hash')
+
+
+def _shared_cache():
+    return caches[PERSISTED_QUERY_CACHE] if PERSISTED_QUERY_CACHE else None
+
+
+def get_document(schema, query, sha256_hash=None, validation_rules=None):
+    """Return ``(document, validation_errors)`` for ``query``.
+
+    Parsed and validated documents are kept in a process-wide LRU keyed by
+    the query's sha256, so repeated operations skip both steps. When the
+    client sends only ``sha256_hash`` (automatic persisted queries), the
+    query text is looked up in the LRU and then in the shared cache.
+    """
+    if query:
+        key = query_hash(query)
+        if sha256_hash and sha256_hash != key:
+            raise GraphQLError(
+                'provided sha does not match query',
+                extensions={'code': 'PERSISTED_QUERY_HASH_MISMATCH'},
+            )
+    else:
+        key = sha256_hash
+
+    entry = documents.get((schema, key))
+    if entry is not None:
+        return entry
+
+    shared = _shared_cache()
+    if not query:
+        query = shared.get(f'graphql:apq:{key}') if shared else None
+        if query is None:
+            raise GraphQLError(
+                'PersistedQueryNotFound', extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'}
+            )
+    elif sha256_hash and shared:
+        shared.set(f'graphql:apq:{key}', query, timeout=None)
+
+    document = parse(query)
+    errors = validate(
+        schema.graphql_schema,
+        document,
+        validation_rules,
+        graphene_settings.MAX_VALIDATION_ERRORS,
+    )
+    entry = (document, errors)
+    documents.set((schema, key), entry)
+    return entry
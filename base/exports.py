@@ -0,0 +1,102 @@
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+
+from .filters import filter_contracts
+from .models import Contract, User
+
+CHUNK_SIZE = 2000
+
+EXPORTS = {
+    'contracts': (Contract, ('id', 'description', 'user_id', 'fidelity', 'amount', 'created_at')),
+    'users': (User, ('id', 'name', 'email', 'created_at')),
+}
+
+# Query parameters of the contract export and the GraphQL filter they set
+RANGE_PARAMS = {
+    'amount': float,
+    'fidelity': int,
+    'created_at': parse_datetime,
+}
+
+
+def contract_filter(params):
+    """Build a ``ContractFilterInput``-shaped dict from query parameters.
+
+    ``user_id``, ``<field>_gte``/``<field>_lte`` for amount, fidelity and
+    created_at, and ``sort`` (e.g. ``-amount``) mean what they do in the
+    GraphQL arguments. Raises ``ValueError`` on malformed values.
+    """
+    filter = {}
+    if params.get('user_id'):
+        filter['user_id'] = int(params['user_id'])
+    for field, parse in RANGE_PARAMS.items():
+        for bound in ('gte', 'lte'):
+            raw = params.get(f'{field}_{bound}')
+            if raw:
+                value = parse(raw)
+                if value is None:
+                    raise ValueError(f'Invalid {field}_{bound}.')
+                filter.setdefault(field, {})[bound] = value
+    return filter
+
+
+def export_rows(resource, params):
+    """Return ``(columns, rows)``; rows are streamed from the database in chunks."""
+    model, columns = EXPORTS[resource]
+    queryset = model.objects.all()
+    if resource == 'contracts':
+        sort = params.get('sort') or None
+        if sort and sort.lstrip('-') not in RANGE_PARAMS:
+            raise ValueError('Invalid sort.')
+        queryset = filter_contracts(queryset, contract_filter(params), sort)
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+    return columns, queryset.values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CHUNK_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson(columns, rows):
+    encoder = DjangoJSONEncoder()
+    for batch in _batches(rows):
+        yield ''.join(encoder.encode(dict(zip(columns, row))) + '\n' for row in batch)
+
+
+def csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in _batches(rows):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+FORMATS = {
+    'ndjson': (ndjson, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,61 @@
+from graphql import GraphQLError
+
+# Indexes on Contract a filter can be answered from, as (equality columns,
+# ordered column): equality filters must match the first part exactly, and
+# range filters and the sort order may only use the ordered column. SQLite
+# appends the rowid to every index, so ties are ordered by id for free.
+CONTRACT_INDEXES = (
+    (('user_id',), 'created_at'),  # contract_user_created_at_idx
+    ((), 'created_at'),  # contract_created_at_id_idx
+    ((), 'amount'),  # contract_amount_idx
+    ((), 'fidelity'),  # contract_fidelity_idx
+)
+
+RANGE_FILTERS = {'amount': 'amount', 'fidelity': 'fidelity', 'created_at': 'createdAt'}
+SORT_NAMES = {'created_at': 'CREATED_AT', 'amount': 'AMOUNT', 'fidelity': 'FIDELITY'}
+
+
+def _is_indexed(equal, ordered):
+    return any(set(columns) == equal and ordered <= {column} for columns, column in CONTRACT_INDEXES)
+
+
+def filter_contracts(queryset, filter=None, sort=None):
+    """Apply a ``ContractFilterInput`` and a sort such as ``'-amount'``.
+
+    Raises ``GraphQLError`` unless one index serves the whole combination,
+    so no filter falls back to scanning the table.
+    """
+    filter = filter or {}
+    sort_column = sort.lstrip('-') if sort else None
+
+    equal = set()
+    if filter.get('user_id') is not None:
+        equal.add('user_id')
+        queryset = queryset.filter(user_id=filter['user_id'])
+
+    ranges = []
+    for column in RANGE_FILTERS:
+        bounds = filter.get(column)
+        if not bounds:
+            continue
+        if bounds.get('gte') is not None:
+            queryset = queryset.filter(**{f'{column}__gte': bounds['gte']})
+        if bounds.get('lte') is not None:
+            queryset = queryset.filter(**{f'{column}__lte': bounds['lte']})
+        ranges.append(column)
+
+    ordered = {*ranges, sort_column} if sort_column else set(ranges)
+    if not _is_indexed(equal, ordered):
+        used = ['userId'] * bool(equal) + [RANGE_FILTERS[column] for column in ranges]
+        message = f"Filtering on {', '.join(used)}"
+        if sort_column:
+            message += f' sorted by {SORT_NAMES[sort_column]}'
+        raise GraphQLError(
+            message + ' is not backed by an index. Combine userId only with a createdAt '
+            'range, and sort by the field a range filters on.',
+            extensions={'code': 'UNINDEXED_FILTER'},
+        )
+
+    if sort:
+        queryset = queryset.order_by(sort, '-pk' if sort.startswith('-') else 'pk')
+    return queryset
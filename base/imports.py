@@ -0,0 +1,324 @@
+"""Streaming bulk import of users and contracts (the ``import_data`` command).
+
+Files are read a record at a time and written in chunks of ``chunk_size``
+records, one transaction per chunk. Chunk ``i`` always holds records
+``[i * chunk_size, (i + 1) * chunk_size)`` of the file, so a checkpoint of
+committed chunk numbers is enough to resume after a crash without
+duplicating rows, even when parallel workers commit chunks out of order.
+The checkpoint is written in each chunk's own transaction.
+"""
+import contextlib
+import csv
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from datetime import timezone as dt_timezone
+
+from django.db import connection, connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Contract, ImportChunk, User
+
+FORMATS = ('csv', 'ndjson')
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise ValueError(f'Cannot tell the format of {path}; pass --format.')
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_records(file, format):
+    """Yield ``(line, record)`` pairs; ``record`` is a dict, or a ``RowError``."""
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            record = RowError(f'Invalid JSON: {e}')
+        if not isinstance(record, (dict, RowError)):
+            record = RowError('Expected a JSON object.')
+        yield line, record
+
+
+def _present(record, key):
+    value = record.get(key)
+    return value is not None and value != ''
+
+
+def _required(record, key, types=(str,)):
+    """``record[key]``, which must be present and one of ``types``.
+
+    NDJSON values can be of any JSON type; anything else is a row error
+    rather than a crash, or a binding error in the database driver.
+    """
+    if not _present(record, key):
+        raise RowError(f'Missing {key}.')
+    value = record[key]
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise RowError(f'Invalid {key}: {value!r}.')
+    return value
+
+
+def _created_at(record):
+    if not _present(record, 'created_at'):
+        return None
+    value = record['created_at']
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise RowError(f'Invalid created_at: {value!r}.')
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=dt_timezone.utc)
+
+
+def _number(record, key, type):
+    value = _required(record, key, (str, int, float))
+    try:
+        return type(value)
+    except (TypeError, ValueError):
+        raise RowError(f'Invalid {key}: {value!r}.')
+
+
+class _Importer:
+    model = None
+    fields = ()
+    conflict = ''
+
+    def __init__(self):
+        # The backend adapter directly: going through the field for every
+        # row costs more than the INSERT itself.
+        self.adapt_datetime = connection.ops.adapt_datetimefield_value
+        self.now = self.adapt_datetime(timezone.now())
+        quote = connection.ops.quote_name
+        columns = [self.model._meta.get_field(name).column for name in self.fields]
+        self.sql = 'INSERT INTO {} ({}) VALUES ({}){}'.format(
+            quote(self.model._meta.db_table),
+            ', '.join(quote(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+            self.conflict,
+        )
+
+    def created_at(self, record):
+        value = _created_at(record)
+        return self.now if value is None else self.adapt_datetime(value)
+
+    def insert(self, rows):
+        """Insert one chunk, inside the caller's transaction; return the rows written."""
+        with connection.cursor() as cursor:
+            cursor.executemany(self.sql, rows)
+            return cursor.rowcount
+
+
+class UserImporter(_Importer):
+    """Records: ``name``, ``email`` and optionally ``created_at``.
+
+    Emails already present are skipped, which also makes re-running a
+    partly imported file safe.
+    """
+
+    model = User
+    fields = ('name', 'email', 'created_at')
+    conflict = ' ON CONFLICT (email) DO NOTHING'
+
+    def row(self, record):
+        return (
+            _required(record, 'name'),
+            _required(record, 'email').strip(),
+            self.created_at(record),
+        )
+
+
+class ContractImporter(_Importer):
+    """Records: ``description``, ``user_email`` (or ``user_id``), ``fidelity``,
+    ``amount`` and optionally ``created_at``.
+
+    Owners are resolved through an email -> id map of every user, loaded
+    once up front.
+    """
+
+    model = Contract
+    fields = ('description', 'user_id', 'fidelity', 'amount', 'created_at')
+
+    def __init__(self):
+        super().__init__()
+        self.user_ids = dict(User.objects.values_list('email', 'id').iterator(chunk_size=10000))
+        self.known_ids = set(self.user_ids.values())
+        self.touched_users = set()
+
+    def user_id(self, record):
+        if _present(record, 'user_email'):
+            email = _required(record, 'user_email')
+            user_id = self.user_ids.get(email.strip())
+            if user_id is None:
+                raise RowError(f'Unknown user_email: {email!r}.')
+            return user_id
+        user_id = _number(record, 'user_id', int)
+        if user_id not in self.known_ids:
+            raise RowError(f'Unknown user_id: {user_id}.')
+        return user_id
+
+    def row(self, record):
+        user_id = self.user_id(record)
+        self.touched_users.add(user_id)
+        return (
+            _required(record, 'description'),
+            user_id,
+            _number(record, 'fidelity', int),
+            _number(record, 'amount', float),
+            self.created_at(record),
+        )
+
+
+IMPORTERS = {
+    'users': UserImporter,
+    'contracts': ContractImporter,
+}
+
+
+class Checkpoint:
+    """Committed chunk numbers of one import, kept as ``ImportChunk`` rows.
+
+    ``complete`` runs in the transaction that wrote the chunk, so a chunk
+    and its checkpoint commit together or not at all.
+    """
+
+    def __init__(self, resource, source, chunk_size):
+        self.resource = resource
+        self.source = os.path.abspath(source)
+        self.chunk_size = chunk_size
+        self.chunks = ImportChunk.objects.filter(resource=resource, source=self.source)
+        self.done = set()
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Resume an unfinished import of the same file; return whether there was one."""
+        committed = list(self.chunks.values_list('chunk', 'rows', 'chunk_size'))
+        sizes = {chunk_size for _, _, chunk_size in committed}
+        if sizes - {self.chunk_size}:
+            raise ValueError(
+                f'An unfinished import of {self.source} used --chunk-size {sizes.pop()}; '
+                'pass the same size, or --restart.'
+            )
+        self.done = {chunk for chunk, _, _ in committed}
+        self.rows = sum(rows for _, rows, _ in committed)
+        return bool(committed)
+
+    def complete(self, chunk, rows):
+        ImportChunk.objects.create(
+            resource=self.resource, source=self.source, chunk_size=self.chunk_size, chunk=chunk, rows=rows
+        )
+        with self.lock:
+            self.done.add(chunk)
+            self.rows += rows
+
+    def remove(self):
+        self.chunks.delete()
+
+
+def chunks(records, importer, chunk_size, skip=frozenset(), on_error=None):
+    """Yield ``(number, rows)`` for each chunk of valid rows, skipping chunk numbers in ``skip``."""
+    number, rows, count = 0, [], 0
+    for line, record in records:
+        if number not in skip:
+            try:
+                if isinstance(record, RowError):
+                    raise record
+                rows.append(importer.row(record))
+            except RowError as e:
+                on_error(line, e)
+        count += 1
+        if count == chunk_size:
+            if number not in skip:
+                yield number, rows
+            number, rows, count = number + 1, [], 0
+    if count and number not in skip:
+        yield number, rows
+
+
+def run_parallel(chunk_iter, write, workers):
+    """Write chunks from ``workers`` threads, each with its own connection.
+
+    At most two chunks per worker are parsed ahead, so memory stays bounded.
+    SQLite takes one writer at a time, so there the writes are serialized
+    here rather than left to time out on the database lock; the workers
+    still overlap reading and parsing the file with writing.
+    """
+    pending = queue.Queue(maxsize=workers * 2)
+    errors = []
+    lock = threading.Lock() if connection.vendor == 'sqlite' else contextlib.nullcontext()
+
+    def worker():
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                if not errors:
+                    try:
+                        with lock:
+                            write(*item)
+                    except Exception as e:
+                        errors.append(e)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        for item in chunk_iter:
+            if errors:
+                break
+            pending.put(item)
+    finally:
+        for _ in threads:
+            pending.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+
+class Progress:
+    def __init__(self, write, every=1.0):
+        self.write = write
+        self.every = every
+        self.start = self.last = time.perf_counter()
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def add(self, rows, force=False):
+        with self.lock:
+            self.rows += rows
+            now = time.perf_counter()
+            if force or now - self.last >= self.every:
+                self.last = now
+                self.write(f'{self.rows} rows, {self.rate():.0f} rows/s')
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.rows / elapsed if elapsed else 0.0
+
@@ -0,0 +1,153 @@
+import asyncio
+from collections import defaultdict
+
+from .models import User, Contract
+
+
+class DataLoader:
+    """Request-scoped batching loader for the synchronous executor.
+
+    Resolvers run one after another, so sibling keys can't be collected
+    while they resolve. Instead, whoever produces a list of parents calls
+    ``enqueue`` with the keys its children will ask for, and the first
+    ``load`` that misses the cache fetches every queued key in one batch.
+    """
+
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._cache = {}
+        self._queue = {}
+        self._batches = {}
+        self._last_enqueued = None
+
+    def enqueue(self, keys):
+        if keys is self._last_enqueued:
+            return
+        self._last_enqueued = keys
+        for key in keys:
+            if key not in self._cache:
+                self._queue[key] = None
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue[key] = None
+            self.dispatch()
+        return self._cache.get(key)
+
+    def prime(self, key, value):
+        self._cache.setdefault(key, value)
+
+    def batch(self, key):
+        return self._batches.get(key, (key,))
+
+    def dispatch(self):
+        keys = tuple(self._queue)
+        self._queue.clear()
+        values = self.batch_load_fn(keys)
+        for key, value in zip(keys, values):
+            self._cache[key] = value
+            self._batches[key] = keys
+
+
+class Loaders:
+    def __init__(self):
+        self.user_by_id = DataLoader(self._load_users)
+        self.contracts_by_user = DataLoader(self._load_contracts_by_user)
+
+    def _load_users(self, keys):
+        users = User.objects.in_bulk(keys)
+        return [users.get(key) for key in keys]
+
+    def _load_contracts_by_user(self, keys):
+        contracts = defaultdict(list)
+        for contract in Contract.objects.filter(user_id__in=keys).order_by('id'):
+            contracts[contract.user_id].append(contract)
+        return [contracts[key] for key in keys]
+
+
+class AsyncDataLoader:
+    """Batching loader for the asynchronous executor.
+
+    Every ``load`` made before the event loop gets back to the loader is
+    fetched in one batch. Resolved values are returned as they are, so
+    cache hits don't need to be awaited.
+    """
+
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._values = {}
+        self._pending = {}
+        # Futures of the batches being fetched, so a key asked for again
+        # meanwhile joins its batch instead of being fetched twice.
+        self._inflight = {}
+        # The event loop keeps only weak references to tasks; an unreferenced
+        # dispatch could be collected before it resolves its futures.
+        self._dispatches = set()
+
+    def enqueue(self, keys):
+        pass
+
+    def load(self, key):
+        if key in self._values:
+            return self._values[key]
+        future = self._pending.get(key) or self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._start_dispatch, loop)
+            future = self._pending[key] = loop.create_future()
+        return future
+
+    def prime(self, key, value):
+        self._values.setdefault(key, value)
+
+    def batch(self, key):
+        return (key,)
+
+    def _start_dispatch(self, loop):
+        task = loop.create_task(self.dispatch())
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def dispatch(self):
+        pending, self._pending = self._pending, {}
+        self._inflight.update(pending)
+        try:
+            values = await self.batch_load_fn(tuple(pending))
+        except Exception as e:
+            for future in pending.values():
+                future.set_exception(e)
+            return
+        finally:
+            for key in pending:
+                del self._inflight[key]
+        for (key, future), value in zip(pending.items(), values):
+            self._values[key] = value
+            future.set_result(value)
+
+
+class AsyncLoaders:
+    def __init__(self):
+        self.user_by_id = AsyncDataLoader(self._load_users)
+        self.contracts_by_user = AsyncDataLoader(self._load_contracts_by_user)
+
+    async def _load_users(self, keys):
+        users = await User.objects.ain_bulk(keys)
+        return [users.get(key) for key in keys]
+
+    async def _load_contracts_by_user(self, keys):
+        contracts = defaultdict(list)
+        async for contract in Contract.objects.filter(user_id__in=keys).order_by('id'):
+            contracts[contract.user_id].append(contract)
+        return [contracts[key] for key in keys]
+
+
+def get_loaders(info):
+    context = info.context
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        if context is not None:
+            context.loaders = loaders
+    return loaders
+
@@ -0,0 +1,82 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from base.benchmarks import (
+    SCENARIOS, BenchmarkData, compare, missing_scenarios, peak_rss_kb, run_scenario, use_database,
+)
+from base.models import Contract, User
+from base.schema import schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every Query and Mutation scenario at fixed concurrency and report "
+        "throughput, p50/p95/p99 latency, SQL queries per operation and peak RSS. "
+        "Mutations write to the database, so point it at seeded benchmark data with "
+        "--database; the checked-in db.sqlite3 is refused."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='Run only these.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--path', default='/graphql/', help='Endpoint for the in-process test client.')
+        parser.add_argument('--url', help='Benchmark a running server over HTTP instead.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Fail on regressions against this results file.')
+        parser.add_argument('--tolerance', type=float, default=0.2)
+        parser.add_argument('--database', help='SQLite file to use instead of the configured database.')
+
+    def handle(self, *args, **options):
+        missing = missing_scenarios(schema)
+        if missing:
+            raise CommandError(f"No benchmark scenario for: {', '.join(missing)}")
+        try:
+            use_database(options['database'])
+            data = BenchmarkData(options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        results = {
+            'meta': {
+                'startedAt': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'users': User.objects.count(),
+                'contracts': Contract.objects.count(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'target': options['url'] or options['path'],
+            },
+            'scenarios': {},
+        }
+        self.stdout.write(
+            f"{'scenario':<34}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/op':>8}{'errors':>8}"
+        )
+        for name in options['scenario'] or SCENARIOS:
+            result = run_scenario(
+                name, data, options['requests'], options['concurrency'], options['path'], options['url']
+            )
+            results['scenarios'][name] = result
+            self.stdout.write(
+                f"{name:<34}{result['throughput']:>9}{result['p50Ms']:>10}{result['p95Ms']:>10}"
+                f"{result['p99Ms']:>10}{result['sqlQueriesPerOp']:>8}{result['errors']:>8}"
+            )
+        results['peakRssKb'] = peak_rss_kb()
+        self.stdout.write(f"peak RSS: {results['peakRssKb'] / 1024:.1f} MB")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = compare(results, json.load(baseline), options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,129 @@
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from graphene_django.views import GraphQLView as BaseGraphQLView
+
+from base import rendering
+from base.benchmarks import percentile, use_database
+from base.models import Contract, User
+from base.schema import schema
+from base.views import GraphQLView
+
+QUERY = """
+query($userId: ID) {
+    contractsGql(filter: {userId: $userId}, sort: CREATED_AT_ASC) {
+        id description userId fidelity amount createdAt
+    }
+}
+"""
+
+
+class StdlibGraphQLView(GraphQLView):
+    """The view as it rendered before: graphene's json.dumps, uncompressed."""
+
+    json_encode = BaseGraphQLView.json_encode
+    compress_min_size = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Time one large contractsGql response end to end through /graphql/'s view with "
+        "the stdlib encoder, orjson, and orjson plus each available compression, and "
+        "estimate the transfer time of each response body. The contracts belong to a "
+        "user created for the run and deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contracts', type=int, default=10000, help='Contracts in the response.')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per variant.')
+        parser.add_argument('--bandwidth', type=float, default=100.0, help='Link speed in Mbit/s.')
+        parser.add_argument('--database', help='SQLite file to use instead of the configured database.')
+
+    def handle(self, *args, **options):
+        try:
+            use_database(options['database'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        user = User.objects.create(name='Rendering benchmark', email=f'bench-render-{time.time_ns()}@example.com')
+        try:
+            Contract.objects.bulk_create(
+                (
+                    Contract(
+                        description=f'Benchmark contract {i}: "solar" lease, Zürich',
+                        user=user, fidelity=i % 36, amount=i * 1.25,
+                    )
+                    for i in range(options['contracts'])
+                ),
+                batch_size=1000,
+            )
+            self.run(json.dumps({'query': QUERY, 'variables': {'userId': user.id}}), options)
+        finally:
+            user.delete()
+
+    def run(self, body, options):
+        variants = [
+            ('stdlib json', StdlibGraphQLView, ''),
+            ('orjson' if rendering.orjson else 'json (no orjson)', GraphQLView, ''),
+            ('+ gzip', GraphQLView, 'gzip'),
+        ]
+        if rendering.brotli is not None:
+            variants.append(('+ brotli', GraphQLView, 'br'))
+
+        factory = RequestFactory()
+        seconds_per_byte = 8 / (options['bandwidth'] * 1_000_000)
+        self.stdout.write(
+            f"{'variant':<18}{'p50 ms':>9}{'p95 ms':>9}{'render ms':>11}{'bytes':>12}{'transfer ms':>13}{'total ms':>10}"
+        )
+        baseline = None
+        for name, view_class, encoding in variants:
+            view = view_class.as_view(schema=schema)
+
+            def post():
+                request = factory.post(
+                    '/graphql/', body, content_type='application/json', headers={'Accept-Encoding': encoding}
+                )
+                start = time.perf_counter()
+                response = view(request)
+                return time.perf_counter() - start, request, response
+
+            post()  # Warm-up, untimed.
+            latencies = []
+            for _ in range(options['requests']):
+                latency, request, response = post()
+                latencies.append(latency)
+
+            content = response.content
+            if response.get('Content-Encoding') == 'gzip':
+                content = gzip.decompress(content)
+            elif response.get('Content-Encoding') == 'br':
+                content = rendering.brotli.decompress(content)
+            result = json.loads(content)
+            if response.status_code != 200 or 'errors' in result:
+                raise CommandError(f'{name}: {response.status_code} {result.get("errors")}')
+            if baseline is None:
+                baseline = result['data']
+            elif result['data'] != baseline:
+                raise CommandError(f'{name}: response differs from the stdlib rendering.')
+
+            # Encoding and compression alone, which execution time swamps.
+            renderer, renders = view_class(schema=schema), []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                rendered = HttpResponse(renderer.json_encode(request, result), content_type='application/json')
+                rendering.compress(request, rendered, renderer.compress_min_size)
+                renders.append(time.perf_counter() - start)
+
+            p50 = percentile(latencies, 0.50) * 1000
+            transfer = len(response.content) * seconds_per_byte * 1000
+            self.stdout.write(
+                f"{name:<18}{p50:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}"
+                f"{percentile(renders, 0.50) * 1000:>11.1f}{len(response.content):>12}"
+                f"{transfer:>13.1f}{p50 + transfer:>10.1f}"
+            )
+        self.stdout.write(
+            f"{len(baseline['contractsGql'])} contracts per response; transfer at {options['bandwidth']:g} Mbit/s."
+        )
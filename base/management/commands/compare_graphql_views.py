@@ -0,0 +1,78 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+
+from base.benchmarks import percentile
+
+DEFAULT_QUERY = """
+{
+    usersConnectionGql(first: 20) { edges { node { id email contracts { amount } } } }
+    contractsConnectionGql(first: 50) { edges { node { id amount user { name } } } }
+    userContractStats { userId contractCount amountSum }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the same operation against the WSGI (/graphql/) and ASGI "
+        "(/graphql/async/) views at equal concurrency and compare latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--query', default=DEFAULT_QUERY)
+
+    def handle(self, *args, **options):
+        body = json.dumps({'query': options['query']})
+        total, concurrency = options['requests'], options['concurrency']
+
+        results = {
+            'sync': self.run_sync(body, total, concurrency),
+            'async': asyncio.run(self.run_async(body, total, concurrency)),
+        }
+        for name, (elapsed, latencies) in results.items():
+            self.stdout.write(
+                f"{name:>5}: {total / elapsed:8.1f} req/s  "
+                f"p50 {percentile(latencies, 0.50) * 1000:7.2f} ms  "
+                f"p95 {percentile(latencies, 0.95) * 1000:7.2f} ms  "
+                f"p99 {percentile(latencies, 0.99) * 1000:7.2f} ms"
+            )
+
+    def run_sync(self, body, total, concurrency):
+        def worker(count):
+            client, latencies = Client(), []
+            for _ in range(count):
+                start = time.perf_counter()
+                response = client.post('/graphql/', body, content_type='application/json')
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.content
+            connections.close_all()
+            return latencies
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            shares = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+            latencies = [latency for chunk in pool.map(worker, shares) for latency in chunk]
+        return time.perf_counter() - start, latencies
+
+    async def run_async(self, body, total, concurrency):
+        client, latencies = AsyncClient(), []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post('/graphql/async/', body, content_type='application/json')
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.content
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(total)))
+        return time.perf_counter() - start, latencies
@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from base import imports, result_cache, search, stats
+from base.models import Contract, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import users or contracts from a CSV or NDJSON file (optionally gzipped), "
+        "streamed in chunks of one transaction each. Import users before their contracts; "
+        "contracts name their owner by user_email or user_id. Each chunk is checkpointed in "
+        "its own transaction, so an interrupted import resumes where it stopped when run "
+        "again with the same arguments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(imports.IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=imports.FORMATS, help='Default: from the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=20000)
+        parser.add_argument('--workers', type=int, default=1, help='Threads writing chunks in parallel.')
+        parser.add_argument('--restart', action='store_true', help='Discard the checkpoint of an unfinished import.')
+        parser.add_argument('--max-errors', type=int, default=0, help='Invalid rows to skip before aborting.')
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Leave the stats and search tables for a later rebuild (e.g. after several files).',
+        )
+
+    def handle(self, *args, **options):
+        path, chunk_size = options['path'], options['chunk_size']
+        if chunk_size < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be positive.')
+        try:
+            format = options['format'] or imports.detect_format(path)
+            file = imports.open_text(path)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        checkpoint = imports.Checkpoint(options['resource'], path, chunk_size)
+        if options['restart']:
+            checkpoint.remove()
+        else:
+            try:
+                if checkpoint.load():
+                    self.stdout.write(
+                        f'Resuming: {len(checkpoint.done)} chunks ({checkpoint.rows} rows) already imported.'
+                    )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        importer = imports.IMPORTERS[options['resource']]()
+        model = User if options['resource'] == 'users' else Contract
+        last_id = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        errors = []
+        existing = []
+
+        def on_error(line, error):
+            errors.append(f'line {line}: {error}')
+            if len(errors) > options['max_errors']:
+                raise CommandError(f'Aborting after {len(errors)} invalid rows:\n' + '\n'.join(errors[-10:]))
+
+        progress = imports.Progress(lambda text: self.stdout.write(f"{options['resource']}: {text}"))
+
+        def write(number, rows):
+            with transaction.atomic():
+                written = importer.insert(rows)
+                checkpoint.complete(number, written)
+            if written < len(rows):
+                existing.append(len(rows) - written)
+            progress.add(written)
+
+        with file:
+            records = imports.read_records(file, format)
+            chunks = imports.chunks(records, importer, chunk_size, frozenset(checkpoint.done), on_error)
+            if options['workers'] == 1:
+                for chunk in chunks:
+                    write(*chunk)
+            else:
+                imports.run_parallel(chunks, write, options['workers'])
+        progress.add(0, force=True)
+        rate = progress.rate()
+
+        if options['resource'] == 'contracts':
+            if not options['skip_derived']:
+                self.stdout.write('Rebuilding contract stats and search index...')
+                stats.rebuild()
+                search.rebuild()
+            result_cache.bump(*(('user', user_id) for user_id in importer.touched_users))
+        # Cached "no such user/contract" answers for the new ids.
+        entity = 'user' if model is User else 'contract'
+        new_ids = model.objects.filter(pk__gt=last_id).values_list('pk', flat=True)
+        result_cache.bump(*((entity, pk) for pk in new_ids.iterator()))
+        checkpoint.remove()
+
+        for error in errors:
+            self.stderr.write(f'Skipped {error}')
+        summary = f"Imported {progress.rows} {options['resource']} at {rate:.0f} rows/s"
+        if progress.rows != checkpoint.rows:
+            summary += f' ({checkpoint.rows} including the resumed run)'
+        if existing:
+            summary += f'; {sum(existing)} already existed'
+        if errors:
+            summary += f'; skipped {len(errors)} invalid rows'
+        self.stdout.write(self.style.SUCCESS(summary + '.'))
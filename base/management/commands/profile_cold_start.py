@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing is imported yet: boots Django the
+# way the WSGI handler does, then serves one request, and prints the timings.
+BOOT_SCRIPT = """
+import io, json, time
+from wsgiref.util import setup_testing_defaults
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+application = get_wsgi_application()
+get_resolver().url_patterns
+booted = time.perf_counter()
+body = {body!r}.encode()
+environ = {{
+    'REQUEST_METHOD': 'POST', 'PATH_INFO': {path!r}, 'CONTENT_TYPE': 'application/json',
+    'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+}}
+setup_testing_defaults(environ)
+statuses = []
+b''.join(application(environ, lambda status, headers: statuses.append(status)))
+assert statuses[0].startswith('200'), statuses[0]
+done = time.perf_counter()
+print(json.dumps({{'boot': booted - start, 'firstRequest': done - booted}}))
+"""
+
+FIRST_REQUEST = json.dumps({'query': '{ __typename }'})
+
+
+def parse_importtime(output):
+    """Return ``{module: (self_us, cumulative_us)}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Boot the WSGI application in a fresh interpreter, serve one GraphQL "
+        "request, and report cold-start time per imported module."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', default='power2go.settings_api', help='Settings module to boot.')
+        parser.add_argument('--path', default='/graphql/')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+        parser.add_argument('--max-ms', type=float, help='Fail when boot plus first request exceeds this.')
+
+    def handle(self, *args, **options):
+        script = BOOT_SCRIPT.format(path=options['path'], body=FIRST_REQUEST)
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': options['profile']},
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+
+        timings = json.loads(process.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(process.stderr)
+        packages = {}
+        for name, (self_us, _) in modules.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+        total_ms = (timings['boot'] + timings['firstRequest']) * 1000
+
+        result = {
+            'profile': options['profile'],
+            'bootMs': round(timings['boot'] * 1000, 1),
+            'firstRequestMs': round(timings['firstRequest'] * 1000, 1),
+            'totalMs': round(total_ms, 1),
+            'moduleCount': len(modules),
+            'packages': {
+                name: round(us / 1000, 1)
+                for name, us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]
+            },
+            'modules': {
+                name: {'selfMs': round(self_us / 1000, 1), 'cumulativeMs': round(cumulative_us / 1000, 1)}
+                for name, (self_us, cumulative_us) in sorted(modules.items(), key=lambda item: -item[1][1])[:options['top']]
+            },
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.stdout.write(
+                f"{result['profile']}: boot {result['bootMs']} ms, first request "
+                f"{result['firstRequestMs']} ms, {result['moduleCount']} modules imported"
+            )
+            self.stdout.write('\nslowest packages (self time, ms):')
+            for name, ms in result['packages'].items():
+                self.stdout.write(f'  {ms:8.1f}  {name}')
+            self.stdout.write('\nslowest modules (cumulative / self, ms):')
+            for name, timing in result['modules'].items():
+                self.stdout.write(f"  {timing['cumulativeMs']:8.1f} {timing['selfMs']:8.1f}  {name}")
+
+        if options['max_ms'] is not None and total_ms > options['max_ms']:
+            raise CommandError(f"Cold start took {total_ms:.1f} ms, over the {options['max_ms']} ms budget.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from base import search
+from base.models import Contract
+
+
+class Command(BaseCommand):
+    help = "Rebuild the contract full-text search index from scratch."
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {Contract.objects.count()} contracts for search."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from base import stats
+from base.models import MonthlyContractStats, UserContractStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user and per-month contract summary tables from scratch."
+
+    def handle(self, *args, **options):
+        stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {UserContractStats.objects.count()} users "
+            f"and {MonthlyContractStats.objects.count()} months."
+        ))
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_stats(apps, schema_editor):
+    Contract = apps.get_model('base', 'Contract')
+    UserContractStats = apps.get_model('base', 'UserContractStats')
+    MonthlyContractStats = apps.get_model('base', 'MonthlyContractStats')
+    totals = {
+        'contract_count': Count('id'),
+        'amount_sum': Sum('amount'),
+        'fidelity_sum': Sum('fidelity'),
+    }
+    UserContractStats.objects.bulk_create(
+        UserContractStats(**row)
+        for row in Contract.objects.order_by().values('user_id').annotate(
+            latest_created_at=Max('created_at'), **totals
+        )
+    )
+    MonthlyContractStats.objects.bulk_create(
+        MonthlyContractStats(**row)
+        for row in Contract.objects.order_by()
+        .annotate(month=TruncMonth('created_at', output_field=models.DateField()))
+        .values('month')
+        .annotate(**totals)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyContractStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('contract_count', models.IntegerField(default=0)),
+                ('amount_sum', models.FloatField(default=0)),
+                ('fidelity_sum', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserContractStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contract_stats', serialize=False, to='base.user')),
+                ('contract_count', models.IntegerField(default=0)),
+                ('amount_sum', models.FloatField(default=0)),
+                ('fidelity_sum', models.BigIntegerField(default=0)),
+                ('latest_created_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0003_contract_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['user', 'created_at'], name='contract_user_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['amount'], name='contract_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['fidelity'], name='contract_fidelity_idx'),
+        ),
+    ]
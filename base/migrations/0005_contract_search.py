@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0004_contract_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                "CREATE VIRTUAL TABLE base_contract_search USING fts5("
+                "description, tokenize='porter unicode61 remove_diacritics 2')",
+                "INSERT INTO base_contract_search (rowid, description) "
+                "SELECT id, description FROM base_contract",
+            ],
+            "DROP TABLE base_contract_search",
+        ),
+    ]
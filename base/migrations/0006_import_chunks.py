@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_contract_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=20)),
+                ('source', models.CharField(max_length=1024)),
+                ('chunk_size', models.IntegerField()),
+                ('chunk', models.IntegerField()),
+                ('rows', models.IntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('resource', 'source', 'chunk'), name='import_chunk_unique')],
+            },
+        ),
+    ]
@@ -4,6 +4,11 @@ class User(models.Model):
     name = models.CharField(max_length=255)
     email = models.EmailField(unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='user_created_at_id_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -14,6 +19,43 @@ class Contract(models.Model):
     fidelity = models.IntegerField()
     amount = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='contract_created_at_id_idx'),
+            models.Index(fields=['user', 'created_at'], name='contract_user_created_at_idx'),
+            models.Index(fields=['amount'], name='contract_amount_idx'),
+            models.Index(fields=['fidelity'], name='contract_fidelity_idx'),
+        ]
     
     def __str__(self):
-        return f"Contract {self.id} - {self.user.name}"
\ No newline at end of file
+        return f"Contract {self.id} - {self.user.name}"
+
+
+class UserContractStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="contract_stats")
+    contract_count = models.IntegerField(default=0)
+    amount_sum = models.FloatField(default=0)
+    fidelity_sum = models.BigIntegerField(default=0)
+    latest_created_at = models.DateTimeField(null=True)
+
+
+class MonthlyContractStats(models.Model):
+    month = models.DateField(unique=True)
+    contract_count = models.IntegerField(default=0)
+    amount_sum = models.FloatField(default=0)
+    fidelity_sum = models.BigIntegerField(default=0)
+
+
+class ImportChunk(models.Model):
+    """A chunk committed by ``import_data``, kept until that import completes."""
+    resource = models.CharField(max_length=20)
+    source = models.CharField(max_length=1024)
+    chunk_size = models.IntegerField()
+    chunk = models.IntegerField()
+    rows = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['resource', 'source', 'chunk'], name='import_chunk_unique'),
+        ]
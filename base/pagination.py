@@ -0,0 +1,78 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from graphene.relay import PageInfo
+from graphql import GraphQLError
+
+from .planner import plan_queryset, selection_tree
+
+DEFAULT_PAGE_SIZE = getattr(settings, 'GRAPHQL_PAGE_SIZE', 20)
+MAX_PAGE_SIZE = getattr(settings, 'GRAPHQL_MAX_PAGE_SIZE', 100)
+
+
+def encode_cursor(instance):
+    value = f'{instance.created_at.isoformat()}|{instance.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError):
+        raise GraphQLError('Invalid cursor.')
+
+
+def page_size(first):
+    if first is None:
+        return DEFAULT_PAGE_SIZE
+    if not 0 < first <= MAX_PAGE_SIZE:
+        raise GraphQLError(f'first must be between 1 and {MAX_PAGE_SIZE}.')
+    return first
+
+
+def after_cursor(queryset, after):
+    # Written as a range on created_at so the (created_at, id) index can
+    # seek to the cursor instead of scanning from the start.
+    created_at, pk = decode_cursor(after)
+    return queryset.filter(
+        Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(pk__gt=pk))
+    )
+
+
+def _page(queryset, info, first, after):
+    size = page_size(first)
+    node_tree = selection_tree(info).get('edges', {}).get('node', {})
+    queryset = plan_queryset(queryset, {**node_tree, 'createdAt': {}})
+    queryset = queryset.order_by('created_at', 'pk')
+    if after:
+        queryset = after_cursor(queryset, after)
+    return queryset[:size + 1], size
+
+
+def _connection(connection_type, rows, size, after):
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(row)) for row in rows[:size]
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=bool(after),
+            has_next_page=len(rows) > size,
+        ),
+    )
+
+
+def connection_from_queryset(connection_type, queryset, info, first=None, after=None):
+    """Return one keyset page of ``queryset`` ordered by ``(created_at, id)``."""
+    queryset, size = _page(queryset, info, first, after)
+    return _connection(connection_type, list(queryset), size, after)
+
+
+async def aconnection_from_queryset(connection_type, queryset, info, first=None, after=None):
+    queryset, size = _page(queryset, info, first, after)
+    return _connection(connection_type, [row async for row in queryset], size, after)
@@ -0,0 +1,117 @@
+import asyncio
+import functools
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+PUBSUB_BACKEND = getattr(settings, 'GRAPHQL_PUBSUB_BACKEND', 'base.pubsub.LocalBackend')
+QUEUE_SIZE = getattr(settings, 'GRAPHQL_SUBSCRIPTION_QUEUE_SIZE', 1000)
+
+CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+
+
+class SubscriberOverflowError(Exception):
+    pass
+
+
+class Backend:
+    """Interface of ``GRAPHQL_PUBSUB_BACKEND``.
+
+    ``publish`` is called once a transaction commits, from whichever thread
+    ran the mutation; messages are small JSON-serialisable dicts. A backend
+    for several nodes forwards them through a broker and delivers what it
+    receives to its local subscribers.
+    """
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """Return an async iterator of the messages published to ``channel``."""
+        raise NotImplementedError
+
+
+class LocalBackend(Backend):
+    """Delivers messages to the subscribers of this process only."""
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # The subscriber's event loop has closed.
+                pass
+
+    @staticmethod
+    def _deliver(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A subscriber that fell this far behind is ended rather than
+            # silently missing events; it resubscribes and refetches.
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                message = await subscriber[1].get()
+                if message is None:
+                    raise SubscriberOverflowError('Subscriber fell behind; resubscribe and refetch.')
+                yield message
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+@functools.cache
+def get_backend():
+    return import_string(PUBSUB_BACKEND)()
+
+
+def contract_channel(user_id=None):
+    return 'contracts' if user_id is None else f'contracts:user:{user_id}'
+
+
+def user_channel(user_id):
+    return f'users:{user_id}'
+
+
+def _publish_on_commit(messages):
+    def publish():
+        backend = get_backend()
+        for channel, message in messages:
+            backend.publish(channel, message)
+    transaction.on_commit(publish)
+
+
+def contracts_changed(action, contracts):
+    """Publish ``action`` for each contract once the transaction commits."""
+    messages = []
+    for contract in contracts:
+        message = {'action': action, 'contract_id': contract.id, 'user_id': contract.user_id}
+        messages.append((contract_channel(), message))
+        messages.append((contract_channel(contract.user_id), message))
+    _publish_on_commit(messages)
+
+
+def users_changed(action, user_ids):
+    _publish_on_commit([
+        (user_channel(user_id), {'action': action, 'user_id': user_id}) for user_id in user_ids
+    ])
@@ -0,0 +1,91 @@
+"""JSON encoding and compression of GraphQL responses.
+
+``orjson`` and ``brotli`` are optional: without them responses are encoded
+with the standard library and compressed with gzip only.
+"""
+import datetime
+import decimal
+import gzip
+import json
+import uuid
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = getattr(settings, 'GRAPHQL_COMPRESS_MIN_SIZE', 1024)
+GZIP_LEVEL = getattr(settings, 'GRAPHQL_GZIP_LEVEL', 5)
+BROTLI_QUALITY = getattr(settings, 'GRAPHQL_BROTLI_QUALITY', 4)
+
+
+def _default(value):
+    # The same output orjson produces natively for these types.
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data, pretty=False):
+    """Encode ``data`` as compact (or indented, sorted) JSON text."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(data, default=_default, option=option).decode()
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits, mostly; the stdlib takes anything.
+            pass
+    if pretty:
+        return json.dumps(data, default=_default, sort_keys=True, indent=2, separators=(',', ': '))
+    return json.dumps(data, default=_default, separators=(',', ':'))
+
+
+def accepted_encodings(request):
+    """Content codings the client accepts, i.e. those not sent with ``q=0``."""
+    accepted = set()
+    for entry in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = entry.partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            if params and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def compress(request, response, min_size=COMPRESS_MIN_SIZE):
+    """Compress ``response`` in place with the best coding the client accepts.
+
+    Brotli is preferred when installed; responses under ``min_size`` bytes
+    are left alone, as compressing them costs more than it saves.
+    """
+    if min_size is None or response.streaming or response.has_header('Content-Encoding'):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if len(response.content) < min_size:
+        return response
+    accepted = accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        response.content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        response['Content-Encoding'] = 'br'
+    elif 'gzip' in accepted or '*' in accepted:
+        response.content = gzip.compress(response.content, GZIP_LEVEL, mtime=0)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response['Content-Length'] = str(len(response.content))
+    return response
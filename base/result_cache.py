@@ -0,0 +1,135 @@
+import functools
+import inspect
+import hashlib
+import json
+import pickle
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.query import QuerySet
+
+from .planner import selection_tree
+from .tracing import metrics
+
+CACHE_ALIAS = getattr(settings, 'GRAPHQL_RESULT_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'GRAPHQL_RESULT_CACHE_TIMEOUT', 300)
+MAX_ENTRY_SIZE = getattr(settings, 'GRAPHQL_RESULT_CACHE_MAX_ENTRY_SIZE', 1024 * 1024)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(entity, pk):
+    return f'graphql:version:{entity}:{pk}'
+
+
+def get_versions(entities):
+    """Return the current version token of each ``(entity, pk)``.
+
+    Versions are random tokens rather than counters, so an evicted version
+    key can never come back with a value an old entry was stored under.
+    """
+    cache = _cache()
+    keys = {_version_key(*entity): entity for entity in entities}
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    for key, token in missing.items():
+        if not cache.add(key, token, timeout=None):
+            token = cache.get(key, token)
+        versions[key] = token
+    return {entity: versions[key] for key, entity in keys.items()}
+
+
+async def aget_versions(entities):
+    cache = _cache()
+    keys = {_version_key(*entity): entity for entity in entities}
+    versions = await cache.aget_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    for key, token in missing.items():
+        if not await cache.aadd(key, token, timeout=None):
+            token = await cache.aget(key, token)
+        versions[key] = token
+    return {entity: versions[key] for key, entity in keys.items()}
+
+
+def bump(*entities):
+    """Invalidate every cached result depending on ``entities`` once committed."""
+    keys = {_version_key(*entity): uuid.uuid4().hex for entity in _entities(entities)}
+    transaction.on_commit(lambda: _cache().set_many(keys, timeout=None))
+
+
+def _result_key(info, kwargs):
+    key = json.dumps(
+        [info.parent_type.name, info.field_name, kwargs, selection_tree(info)],
+        sort_keys=True,
+        default=str,
+    )
+    return 'graphql:result:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _entities(dependencies):
+    return [(entity, str(pk)) for entity, pk in dependencies]
+
+
+def cached_field(dependencies):
+    """Cache a root resolver's result until one of its entities changes.
+
+    ``dependencies(result, **kwargs)`` returns the ``(entity, pk)`` pairs the
+    result was built from; mutations call ``bump`` with the same pairs.
+    """
+    def decorator(resolver):
+        @functools.wraps(resolver)
+        def wrapper(root, info, **kwargs):
+            cache = _cache()
+            key = _result_key(info, kwargs)
+            entry = cache.get(key)
+            if entry is not None:
+                versions, payload = entry
+                if get_versions(versions) == versions:
+                    metrics.count_cache_lookup('hit')
+                    return pickle.loads(payload)
+
+            metrics.count_cache_lookup('miss')
+            # Versions of the entities named by the arguments are read before
+            # resolving, so a write committed meanwhile invalidates the entry.
+            before = get_versions(_entities(dependencies(None, **kwargs)))
+            result = resolver(root, info, **kwargs)
+            if isinstance(result, QuerySet):
+                result = list(result)
+
+            payload = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+            if len(payload) <= MAX_ENTRY_SIZE:
+                versions = get_versions(_entities(dependencies(result, **kwargs)))
+                cache.set(key, ({**versions, **before}, payload), CACHE_TIMEOUT)
+            else:
+                metrics.count_cache_lookup('oversized')
+            return result
+
+        @functools.wraps(resolver)
+        async def async_wrapper(root, info, **kwargs):
+            cache = _cache()
+            key = _result_key(info, kwargs)
+            entry = await cache.aget(key)
+            if entry is not None:
+                versions, payload = entry
+                if await aget_versions(versions) == versions:
+                    metrics.count_cache_lookup('hit')
+                    return pickle.loads(payload)
+
+            metrics.count_cache_lookup('miss')
+            before = await aget_versions(_entities(dependencies(None, **kwargs)))
+            result = await resolver(root, info, **kwargs)
+
+            payload = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+            if len(payload) <= MAX_ENTRY_SIZE:
+                versions = await aget_versions(_entities(dependencies(result, **kwargs)))
+                await cache.aset(key, ({**versions, **before}, payload), CACHE_TIMEOUT)
+            else:
+                metrics.count_cache_lookup('oversized')
+            return result
+
+        return async_wrapper if inspect.iscoroutinefunction(resolver) else wrapper
+    return decorator
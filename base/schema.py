@@ -1,20 +1,81 @@
 import graphene 
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
 from graphene_django import DjangoObjectType
 
+from . import pubsub, search, stats
+from .db import delete_returning, insert_if_exists, update_returning
 from .exceptions import UserAlreadyExistsError, UserHasContractsError
-from .models import User, Contract
+from .filters import filter_contracts
+from .loaders import get_loaders
+from .models import User, Contract, MonthlyContractStats, UserContractStats
+from .pagination import connection_from_queryset
+from .planner import is_prefetched, plan_queryset, selection_tree
+from .result_cache import bump, cached_field
 
 
 class UserType(DjangoObjectType):
+    contracts = graphene.List(lambda: ContractType)
+
     class Meta:
         model = User
         fields =  ('id', 'name', 'email', 'created_at')
+
+    def resolve_contracts(self, info):
+        if is_prefetched(self, 'contracts'):
+            return self.contracts.all()
+        loaders = get_loaders(info)
+        loaders.user_by_id.prime(self.id, self)
+        return loaders.contracts_by_user.load(self.id)
         
 class ContractType(DjangoObjectType):
     user_id = graphene.ID()
     class Meta:
         model = Contract
         fields = ('id', 'description', 'user', 'fidelity', 'amount', 'created_at',)
+
+    def resolve_user(self, info):
+        if Contract.user.is_cached(self):
+            return self.user
+        loaders = get_loaders(info)
+        user = loaders.user_by_id.load(self.user_id)
+        if isinstance(user, User) and 'contracts' in selection_tree(info):
+            loaders.contracts_by_user.enqueue(loaders.user_by_id.batch(self.user_id))
+        return user
+
+
+class UserContractStatsType(DjangoObjectType):
+    user_id = graphene.ID()
+    fidelity_avg = graphene.Float()
+
+    class Meta:
+        model = UserContractStats
+        fields = ('user', 'contract_count', 'amount_sum', 'latest_created_at')
+
+    def resolve_user(self, info):
+        return get_loaders(info).user_by_id.load(self.user_id)
+
+    def resolve_fidelity_avg(self, info):
+        return self.fidelity_sum / self.contract_count if self.contract_count else None
+
+class MonthlyContractStatsType(DjangoObjectType):
+    fidelity_avg = graphene.Float()
+
+    class Meta:
+        model = MonthlyContractStats
+        fields = ('month', 'contract_count', 'amount_sum')
+
+    def resolve_fidelity_avg(self, info):
+        return self.fidelity_sum / self.contract_count if self.contract_count else None
+
+
+class UserConnection(graphene.relay.Connection):
+    class Meta:
+        node = UserType
+
+class ContractConnection(graphene.relay.Connection):
+    class Meta:
+        node = ContractType
         
     
 class CreateUserInput(graphene.InputObjectType):
@@ -49,11 +110,68 @@ class UpdateContractInput(graphene.InputObjectType):
     
 class DeleteContractInput(graphene.InputObjectType):
     id = graphene.ID(required=True)
+
+class FloatRangeInput(graphene.InputObjectType):
+    gte = graphene.Float()
+    lte = graphene.Float()
+
+class IntRangeInput(graphene.InputObjectType):
+    gte = graphene.Int()
+    lte = graphene.Int()
+
+class DateTimeRangeInput(graphene.InputObjectType):
+    gte = graphene.DateTime()
+    lte = graphene.DateTime()
+
+class ContractFilterInput(graphene.InputObjectType):
+    user_id = graphene.ID()
+    amount = FloatRangeInput()
+    fidelity = IntRangeInput()
+    created_at = DateTimeRangeInput()
+
+class ContractConnectionFilterInput(graphene.InputObjectType):
+    """The filters the connection's (createdAt, id) keyset order can serve."""
+    user_id = graphene.ID()
+    created_at = DateTimeRangeInput()
+
+class ContractSort(graphene.Enum):
+    CREATED_AT_ASC = 'created_at'
+    CREATED_AT_DESC = '-created_at'
+    AMOUNT_ASC = 'amount'
+    AMOUNT_DESC = '-amount'
+    FIDELITY_ASC = 'fidelity'
+    FIDELITY_DESC = '-fidelity'
       
 
+def contract_queryset(filter=None, sort=None):
+    return filter_contracts(Contract.objects.all(), filter, sort.value if sort else None)
+
+
+def _contract_dependencies(contract, input):
+    dependencies = [('contract', input.id)]
+    if contract is not None and Contract.user.is_cached(contract):
+        dependencies.append(('user', contract.user_id))
+    return dependencies
+
+
 class Query(graphene.ObjectType):
     users_gql = graphene.List(UserType)
-    contracts_gql = graphene.List(ContractType)
+    contracts_gql = graphene.List(
+				ContractType,
+				filter=ContractFilterInput(),
+				sort=ContractSort()
+    )
+    users_connection_gql = graphene.Field(
+				UserConnection,
+				first=graphene.Int(),
+				after=graphene.String()
+    )
+    contracts_connection_gql = graphene.Field(
+				ContractConnection,
+				first=graphene.Int(),
+				after=graphene.String(),
+				filter=ContractConnectionFilterInput()
+    )
     get_user_gql = graphene.Field(UserType, id=graphene.ID(required=True))
     get_contract_gql = graphene.Field(ContractType, input=GetContractInput(required=True))
     get_contract_without_nested_user_gql = graphene.Field(
@@ -62,40 +180,74 @@ class Query(graphene.ObjectType):
     )
     getContractsByUser = graphene.List(
 				ContractType, 
-				user_id=graphene.ID(required=True)
+				user_id=graphene.ID(required=True),
+				filter=ContractFilterInput(),
+				sort=ContractSort()
+    )
+    user_contract_stats = graphene.List(UserContractStatsType, user_id=graphene.ID())
+    contract_stats_by_month = graphene.List(
+				MonthlyContractStatsType,
+				since=graphene.Date(),
+				until=graphene.Date()
+    )
+    search_contracts = graphene.Field(
+				ContractConnection,
+				query=graphene.String(required=True),
+				first=graphene.Int(),
+				after=graphene.String()
     )
     
     def resolve_users_gql(self, info, **kwargs):
-        return User.objects.all()
+        return plan_queryset(User.objects.all(), info)
     
-    def resolve_contracts_gql(self, info, **kwargs):
-        return Contract.objects.all()
+    def resolve_contracts_gql(self, info, filter=None, sort=None):
+        return plan_queryset(contract_queryset(filter, sort), info)
+
+    def resolve_users_connection_gql(self, info, first=None, after=None):
+        return connection_from_queryset(UserConnection, User.objects.all(), info, first, after)
+
+    def resolve_contracts_connection_gql(self, info, first=None, after=None, filter=None):
+        queryset = contract_queryset(filter, ContractSort.CREATED_AT_ASC)
+        return connection_from_queryset(ContractConnection, queryset, info, first, after)
     
+    @cached_field(lambda user, id: [('user', id)])
     def resolve_get_user_gql(self, info, id):
         try:
-            return User.objects.get(id=id)
+            return plan_queryset(User.objects.all(), info).get(id=id)
         except User.DoesNotExist:
             return None 
         
+    @cached_field(_contract_dependencies)
     def resolve_get_contract_gql(self, info, input):
         try:
-            return Contract.objects.select_related('user').get(id=input.id)
+            return plan_queryset(Contract.objects.all(), info).get(id=input.id)
         except Contract.DoesNotExist:
             return None 
     
+    @cached_field(_contract_dependencies)
     def resolve_get_contract_without_nested_user_gql(self, info, input):
         try:
-            contract = Contract.objects.get(id=input.id)
+            contract = plan_queryset(Contract.objects.all(), info).get(id=input.id)
             contract.user_id
             return contract
         except Contract.DoesNotExist:
             return None 
     
-    def resolve_get_contracts_by_user_gql(self, info, user_id):
-        try:
-            return Contract.objects.filter(user_id=user_id)
-        except User.DoesNotExist:
-            return [] 
+    @cached_field(lambda contracts, user_id, **kwargs: [('user', user_id)])
+    def resolve_getContractsByUser(self, info, user_id, filter=None, sort=None):
+        return plan_queryset(contract_queryset({**(filter or {}), 'user_id': user_id}, sort), info)
+
+    def resolve_user_contract_stats(self, info, user_id=None):
+        rows = list(stats.user_stats(user_id))
+        if 'user' in selection_tree(info):
+            get_loaders(info).user_by_id.enqueue([row.user_id for row in rows])
+        return rows
+
+    def resolve_contract_stats_by_month(self, info, since=None, until=None):
+        return stats.monthly_stats(since, until)
+
+    def resolve_search_contracts(self, info, query, first=None, after=None):
+        return search.search_connection(ContractConnection, info, query, first, after)
         
         
 class CreateUser(graphene.Mutation):
@@ -108,12 +260,18 @@ class CreateUser(graphene.Mutation):
     message = graphene.String()
     
     def mutate(self, info, input):
-        try:    
-            if User.objects.filter(email=input.email).exists():								
-                raise UserAlreadyExistsError("User with this email already exists.") 
-                         
+        try:
             user = User(name=input.name, email=input.email)
-            user.save()
+            try:
+                # The unique constraint on email is the check, so there is no
+                # race between a lookup and the INSERT.
+                with transaction.atomic():
+                    user.save()
+            except IntegrityError:
+                raise UserAlreadyExistsError("User with this email already exists.")
+
+            bump(('user', user.id))
+            pubsub.users_changed(pubsub.CREATED, [user.id])
             return CreateUser(
                 id=user.id,
                 name=user.name,
@@ -136,14 +294,20 @@ class UpdateUser(graphene.Mutation):
     
     def mutate(self, info, input):
         try:
-            user = User.objects.get(id=input.id)
-            
+            values = {}
             if input.name:
-                user.name = input.name
+                values['name'] = input.name
             if input.email:
-                user.email = input.email
-                
-            user.save()
+                values['email'] = input.email
+
+            if not values:
+                return UpdateUser(user=User.objects.get(id=input.id))
+            updated = update_returning(User.objects.filter(id=input.id), **values)
+            if not updated:
+                raise User.DoesNotExist
+            user = updated[0]
+            bump(('user', user.id))
+            pubsub.users_changed(pubsub.UPDATED, [user.id])
             return UpdateUser(user=user)
         
         except User.DoesNotExist:
@@ -162,12 +326,19 @@ class DeleteUser(graphene.Mutation):
         
     def mutate(self, info, input):
         try:
-            user = User.objects.get(id=input.id)
-   
-            if Contract.objects.filter(user_id=user.id).exists():
-                raise UserHasContractsError("User has contract(s) and cannot be deleted.")
-			
-            user.delete()
+            has_contracts = Exists(Contract.objects.filter(user_id=OuterRef('pk')))
+            with transaction.atomic():
+                deleted = delete_returning(User.objects.filter(~has_contracts, id=input.id))
+                if deleted:
+                    UserContractStats.objects.filter(user_id=input.id).delete()
+
+            if not deleted:
+                # Only a failed delete pays for finding out why.
+                if User.objects.filter(id=input.id).exists():
+                    raise UserHasContractsError("User has contract(s) and cannot be deleted.")
+                raise User.DoesNotExist
+            bump(('user', input.id))
+            pubsub.users_changed(pubsub.DELETED, [deleted[0].id])
             return DeleteUser(success_deletion=True, message="User deleted successfully.")
 			
         except User.DoesNotExist:
@@ -185,14 +356,19 @@ class CreateContract(graphene.Mutation):
 
     def mutate(self, info, input):
         try:
-            user = User.objects.get(id=input.user_id)
             contract = Contract(
                 description=input.description, 
-                user=user, 
+                user_id=input.user_id, 
                 fidelity=input.fidelity, 
                 amount=input.amount
             )
-            contract.save()
+            with transaction.atomic():
+                if not insert_if_exists(contract, User.objects.filter(id=input.user_id)):
+                    raise User.DoesNotExist
+                stats.record_created([contract])
+                search.record_created([contract])
+            bump(('contract', contract.id), ('user', contract.user_id))
+            pubsub.contracts_changed(pubsub.CREATED, [contract])
             return CreateContract(contract=contract, message="Contract created successfully.")
         
         except User.DoesNotExist:
@@ -210,16 +386,27 @@ class UpdateContract(graphene.Mutation):
     
     def mutate(self, info, input):
         try:
-            contract = Contract.objects.get(id=input.id)
-            
+            values = {}
             if input.description:
-                contract.description = input.description
+                values['description'] = input.description
             if input.fidelity is not None:
-                contract.fidelity = input.fidelity
+                values['fidelity'] = input.fidelity
             if input.amount is not None:
-                contract.amount = input.amount
-                
-            contract.save()
+                values['amount'] = input.amount
+
+            if not values:
+                contract = Contract.objects.get(id=input.id)
+                return UpdateContract(contract=contract, message="Contract updated successfully")
+            with transaction.atomic():
+                stats.record_update(input.id, input.amount, input.fidelity)
+                updated = update_returning(Contract.objects.filter(id=input.id), **values)
+                if not updated:
+                    raise Contract.DoesNotExist
+                contract = updated[0]
+                if 'description' in values:
+                    search.record_updated([contract])
+            bump(('contract', contract.id), ('user', contract.user_id))
+            pubsub.contracts_changed(pubsub.UPDATED, [contract])
             return UpdateContract(contract=contract, message="Contract updated successfully")
         
         except Contract.DoesNotExist:
@@ -237,7 +424,15 @@ class DeleteContract(graphene.Mutation):
     
     def mutate(self, info, input):
         try:
-            Contract.objects.get(id=input.id).delete()
+            with transaction.atomic():
+                deleted = delete_returning(Contract.objects.filter(id=input.id))
+                if not deleted:
+                    raise Contract.DoesNotExist
+                contract = deleted[0]
+                stats.record_deleted([contract])
+                search.record_deleted([contract.id])
+            bump(('contract', input.id), ('user', contract.user_id))
+            pubsub.contracts_changed(pubsub.DELETED, [contract])
             return DeleteContract(success_deletion=True, message="Contract deleted successfully.")
         
         except Contract.DoesNotExist:
@@ -245,6 +440,219 @@ class DeleteContract(graphene.Mutation):
         
         except Exception as e:
             return DeleteContract(success_deletion=False, message=str(e))
+
+
+class BulkItemError(graphene.ObjectType):
+    index = graphene.Int()
+    message = graphene.String()
+
+
+def _parse_ids(items, errors):
+    ids = {}
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            pk = int(item.id)
+        except (TypeError, ValueError):
+            errors.append(BulkItemError(index=index, message="Invalid id."))
+            continue
+        if pk in seen:
+            errors.append(BulkItemError(index=index, message="Duplicate id in batch."))
+            continue
+        seen.add(pk)
+        ids[index] = pk
+    return ids
+
+
+class CreateUsersBulk(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(CreateUserInput), required=True)
+
+    users = graphene.List(UserType)
+    errors = graphene.List(BulkItemError)
+    message = graphene.String()
+
+    def mutate(self, info, input):
+        try:
+            errors = []
+            emails = [item.email for item in input]
+            taken = set(User.objects.only('email').in_bulk(emails, field_name='email'))
+            for index, email in enumerate(emails):
+                if email in taken:
+                    errors.append(BulkItemError(index=index, message="User with this email already exists."))
+                taken.add(email)
+
+            if errors:
+                return CreateUsersBulk(users=[], errors=errors, message="No users were created.")
+
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    User(name=item.name, email=item.email) for item in input
+                )
+                bump(*(('user', user.id) for user in users))
+                pubsub.users_changed(pubsub.CREATED, [user.id for user in users])
+            return CreateUsersBulk(users=users, errors=[], message=f"{len(users)} users created successfully.")
+
+        except Exception as e:
+            return CreateUsersBulk(users=[], errors=[], message=str(e))
+
+
+class CreateContractsBulk(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(CreateContractInput), required=True)
+
+    contracts = graphene.List(ContractType)
+    errors = graphene.List(BulkItemError)
+    message = graphene.String()
+
+    def mutate(self, info, input):
+        try:
+            errors = []
+            user_ids = {}
+            for index, item in enumerate(input):
+                try:
+                    user_ids[index] = int(item.user_id)
+                except (TypeError, ValueError):
+                    errors.append(BulkItemError(index=index, message="Invalid user id."))
+
+            users = User.objects.in_bulk(set(user_ids.values()))
+            for index, user_id in user_ids.items():
+                if user_id not in users:
+                    errors.append(BulkItemError(index=index, message="User don't exist."))
+
+            if errors:
+                errors.sort(key=lambda error: error.index)
+                return CreateContractsBulk(contracts=[], errors=errors, message="No contracts were created.")
+
+            loaders = get_loaders(info)
+            for user in users.values():
+                loaders.user_by_id.prime(user.id, user)
+
+            with transaction.atomic():
+                contracts = Contract.objects.bulk_create(
+                    Contract(
+                        description=item.description,
+                        user=users[user_ids[index]],
+                        fidelity=item.fidelity,
+                        amount=item.amount
+                    )
+                    for index, item in enumerate(input)
+                )
+                stats.record_created(contracts)
+                search.record_created(contracts)
+                pubsub.contracts_changed(pubsub.CREATED, contracts)
+                bump(
+                    *(('contract', contract.id) for contract in contracts),
+                    *(('user', user_id) for user_id in users),
+                )
+            return CreateContractsBulk(
+                contracts=contracts, errors=[], message=f"{len(contracts)} contracts created successfully."
+            )
+
+        except Exception as e:
+            return CreateContractsBulk(contracts=[], errors=[], message=str(e))
+
+
+class UpdateContractsBulk(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(UpdateContractInput), required=True)
+
+    contracts = graphene.List(ContractType)
+    errors = graphene.List(BulkItemError)
+    message = graphene.String()
+
+    def mutate(self, info, input):
+        try:
+            errors = []
+            ids = _parse_ids(input, errors)
+            contracts = Contract.objects.in_bulk(ids.values())
+            for index, pk in ids.items():
+                if pk not in contracts:
+                    errors.append(BulkItemError(index=index, message="Contract don't exist."))
+
+            if errors:
+                errors.sort(key=lambda error: error.index)
+                return UpdateContractsBulk(contracts=[], errors=errors, message="No contracts were updated.")
+
+            fields = set()
+            changes = []
+            described = []
+            for index, pk in ids.items():
+                item, contract = input[index], contracts[pk]
+                changes.append((contract.amount, contract.fidelity, contract))
+                if item.description:
+                    if item.description != contract.description:
+                        described.append(contract)
+                    contract.description = item.description
+                    fields.add('description')
+                if item.fidelity is not None:
+                    contract.fidelity = item.fidelity
+                    fields.add('fidelity')
+                if item.amount is not None:
+                    contract.amount = item.amount
+                    fields.add('amount')
+
+            updated = [contracts[pk] for pk in ids.values()]
+            if fields:
+                with transaction.atomic():
+                    Contract.objects.bulk_update(updated, sorted(fields))
+                    stats.record_updated(changes)
+                    search.record_updated(described)
+                    pubsub.contracts_changed(pubsub.UPDATED, updated)
+                    bump(
+                        *(('contract', contract.id) for contract in updated),
+                        *(('user', user_id) for user_id in {contract.user_id for contract in updated}),
+                    )
+
+            get_loaders(info).user_by_id.enqueue([contract.user_id for contract in updated])
+            return UpdateContractsBulk(
+                contracts=updated, errors=[], message=f"{len(updated)} contracts updated successfully."
+            )
+
+        except Exception as e:
+            return UpdateContractsBulk(contracts=[], errors=[], message=str(e))
+
+
+class DeleteContractsBulk(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(DeleteContractInput), required=True)
+
+    success_deletion = graphene.Boolean()
+    deleted_count = graphene.Int()
+    errors = graphene.List(BulkItemError)
+    message = graphene.String()
+
+    def mutate(self, info, input):
+        try:
+            errors = []
+            ids = _parse_ids(input, errors)
+            existing = Contract.objects.only('id', 'user', 'amount', 'fidelity', 'created_at').in_bulk(ids.values())
+            for index, pk in ids.items():
+                if pk not in existing:
+                    errors.append(BulkItemError(index=index, message="Contract don't exist."))
+
+            if errors:
+                errors.sort(key=lambda error: error.index)
+                return DeleteContractsBulk(
+                    success_deletion=False, deleted_count=0, errors=errors, message="No contracts were deleted."
+                )
+
+            with transaction.atomic():
+                deleted, _ = Contract.objects.filter(id__in=existing).delete()
+                stats.record_deleted(existing.values())
+                search.record_deleted(existing)
+                pubsub.contracts_changed(pubsub.DELETED, existing.values())
+                bump(
+                    *(('contract', pk) for pk in existing),
+                    *(('user', user_id) for user_id in {contract.user_id for contract in existing.values()}),
+                )
+            return DeleteContractsBulk(
+                success_deletion=True, deleted_count=deleted, errors=[],
+                message=f"{deleted} contracts deleted successfully."
+            )
+
+        except Exception as e:
+            return DeleteContractsBulk(success_deletion=False, deleted_count=0, errors=[], message=str(e))
         
         
 class Mutation(graphene.ObjectType):
@@ -254,5 +662,9 @@ class Mutation(graphene.ObjectType):
     delete_user_gql = DeleteUser.Field()
     delete_contract_gql = DeleteContract.Field()
     update_contract_gql = UpdateContract.Field()
+    create_users_bulk = CreateUsersBulk.Field()
+    create_contracts_bulk = CreateContractsBulk.Field()
+    update_contracts_bulk = UpdateContractsBulk.Field()
+    delete_contracts_bulk = DeleteContractsBulk.Field()
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
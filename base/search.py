@@ -0,0 +1,110 @@
+import base64
+import re
+
+from django.db import connection, connections, router, transaction
+from graphene.relay import PageInfo
+from graphql import GraphQLError
+
+from .models import Contract
+from .pagination import page_size
+from .planner import plan_queryset, selection_tree
+
+# FTS5 table over Contract.description, keyed by rowid = contract id. It
+# keeps its own copy of the text, so removing a row needs only the id.
+TABLE = 'base_contract_search'
+
+TERM = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """Quote every word of ``query`` so FTS5 syntax in it is matched literally.
+
+    The terms are ANDed, as in ``solar panel`` matching both words anywhere.
+    """
+    terms = TERM.findall(query)
+    if not terms:
+        raise GraphQLError('Search query must contain at least one word.')
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def encode_cursor(rank, pk):
+    return base64.urlsafe_b64encode(f'{rank!r}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return float(rank), int(pk)
+    except (ValueError, UnicodeError):
+        raise GraphQLError('Invalid cursor.')
+
+
+def record_created(contracts):
+    rows = [(contract.id, contract.description) for contract in contracts]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {TABLE} (rowid, description) VALUES (%s, %s)', rows)
+
+
+def record_deleted(ids):
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk,) for pk in ids])
+
+
+def record_updated(contracts):
+    """Reindex ``contracts`` whose description changed."""
+    rows = [(contract.description, contract.id) for contract in contracts]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'UPDATE {TABLE} SET description = %s WHERE rowid = %s', rows)
+
+
+@transaction.atomic
+def rebuild():
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, description) '
+            f'SELECT id, description FROM {Contract._meta.db_table}'
+        )
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+def ranked_ids(query, limit, after=None):
+    """``(rank, id)`` of the best ``limit`` matches, after the ``after`` cursor.
+
+    ``rank`` is FTS5's BM25 score, lower is better; ties go by id so pages
+    never overlap.
+    """
+    sql = f'SELECT rank, rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+    params = [match_expression(query)]
+    if after:
+        rank, pk = decode_cursor(after)
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [rank, rank, pk]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(limit)
+    with connections[router.db_for_read(Contract)].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_connection(connection_type, info, query, first=None, after=None):
+    """Return one BM25-ranked page of contracts matching ``query``."""
+    size = page_size(first)
+    matches = ranked_ids(query, size + 1, after)
+    node_tree = selection_tree(info).get('edges', {}).get('node', {})
+    queryset = plan_queryset(Contract.objects.all(), node_tree)
+    contracts = queryset.in_bulk([pk for _, pk in matches[:size]])
+    edges = [
+        connection_type.Edge(node=contracts[pk], cursor=encode_cursor(rank, pk))
+        for rank, pk in matches[:size]
+        if pk in contracts
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=bool(after),
+            has_next_page=len(matches) > size,
+        ),
+    )
@@ -0,0 +1,183 @@
+from collections import defaultdict
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DateField, F, Max, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import Contract, MonthlyContractStats, UserContractStats
+
+
+def month_of(created_at):
+    return timezone.localtime(created_at).date().replace(day=1)
+
+
+class _Delta:
+    __slots__ = ('count', 'amount', 'fidelity', 'latest')
+
+    def __init__(self):
+        self.count = 0
+        self.amount = 0
+        self.fidelity = 0
+        self.latest = None
+
+    def add(self, sign, amount, fidelity, created_at=None):
+        self.count += sign
+        self.amount += sign * amount
+        self.fidelity += sign * fidelity
+        if sign > 0 and created_at and (self.latest is None or created_at > self.latest):
+            self.latest = created_at
+
+    def values(self):
+        return [self.count, self.amount, self.fidelity]
+
+
+_DELTA_COLUMNS = ('contract_count', 'amount_sum', 'fidelity_sum')
+
+
+def _upsert(model, key, deltas, latest=None):
+    """Add ``deltas`` (key value -> _Delta) to ``model``'s rows, creating missing ones.
+
+    One ``INSERT ... ON CONFLICT DO UPDATE`` per batch of keys, however many
+    rows it touches. ``latest`` is the SQL assigned to ``latest_created_at``
+    on conflict, when the model has that column.
+    """
+    if not deltas:
+        return
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    key_field = model._meta.get_field(key)
+    columns = [key_field.column, *_DELTA_COLUMNS]
+    assignments = [f'{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}' for column in _DELTA_COLUMNS]
+    if latest is not None:
+        columns.append('latest_created_at')
+        assignments.append(f'{quote("latest_created_at")} = {latest}')
+    rows = [
+        [key_field.get_db_prep_value(value, connection), *delta.values()]
+        + ([connection.ops.adapt_datetimefield_value(delta.latest)] if latest is not None else [])
+        for value, delta in deltas.items()
+    ]
+    batch_size = connection.ops.bulk_batch_size(columns, rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            placeholders = ', '.join(['(%s)' % ', '.join(['%s'] * len(columns))] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(quote(column) for column in columns)}) '
+                f'VALUES {placeholders} '
+                f'ON CONFLICT ({quote(key_field.column)}) DO UPDATE SET {", ".join(assignments)}',
+                [value for row in batch for value in row],
+            )
+
+
+def _apply(by_user, by_month, recompute_latest=False):
+    quote = connections[router.db_for_write(UserContractStats)].ops.quote_name
+    table, column = quote(UserContractStats._meta.db_table), quote('latest_created_at')
+    if recompute_latest:
+        contracts = Contract._meta
+        latest = (
+            f'(SELECT MAX({quote(contracts.get_field("created_at").column)}) FROM {quote(contracts.db_table)} '
+            f'WHERE {quote(contracts.get_field("user").column)} = {table}.{quote(UserContractStats._meta.pk.column)})'
+        )
+    else:
+        latest = (
+            f'CASE WHEN {table}.{column} IS NULL OR excluded.{column} > {table}.{column} '
+            f'THEN excluded.{column} ELSE {table}.{column} END'
+        )
+    _upsert(UserContractStats, 'user', by_user, latest)
+    _upsert(MonthlyContractStats, 'month', by_month)
+
+
+def record_created(contracts):
+    by_user, by_month = defaultdict(_Delta), defaultdict(_Delta)
+    for contract in contracts:
+        by_user[contract.user_id].add(1, contract.amount, contract.fidelity, contract.created_at)
+        by_month[month_of(contract.created_at)].add(1, contract.amount, contract.fidelity)
+    with transaction.atomic(savepoint=False):
+        _apply(by_user, by_month)
+
+
+def record_updated(changes):
+    """``changes`` is an iterable of ``(old_amount, old_fidelity, contract)``."""
+    by_user, by_month = defaultdict(_Delta), defaultdict(_Delta)
+    for old_amount, old_fidelity, contract in changes:
+        if (old_amount, old_fidelity) == (contract.amount, contract.fidelity):
+            continue
+        for deltas, key in ((by_user, contract.user_id), (by_month, month_of(contract.created_at))):
+            deltas[key].amount += contract.amount - old_amount
+            deltas[key].fidelity += contract.fidelity - old_fidelity
+    with transaction.atomic(savepoint=False):
+        _apply(by_user, by_month)
+
+
+def record_update(pk, amount=None, fidelity=None):
+    """Apply the delta of setting ``amount``/``fidelity`` on contract ``pk``.
+
+    The old values are read by subqueries of the stats UPDATEs themselves,
+    so this has to run before the contract's own UPDATE, in its transaction.
+    """
+    old = Contract.objects.filter(pk=pk)
+    fields = {}
+    if amount is not None:
+        fields['amount_sum'] = F('amount_sum') + amount - Subquery(old.values('amount'))
+    if fidelity is not None:
+        fields['fidelity_sum'] = F('fidelity_sum') + fidelity - Subquery(
+            old.values('fidelity'), output_field=MonthlyContractStats._meta.get_field('fidelity_sum')
+        )
+    if not fields:
+        return
+    month = old.annotate(month=TruncMonth('created_at', output_field=DateField())).values('month')
+    with transaction.atomic(savepoint=False):
+        UserContractStats.objects.filter(user_id=Subquery(old.values('user_id'))).update(**fields)
+        MonthlyContractStats.objects.filter(month=Subquery(month)).update(**fields)
+
+
+def record_deleted(contracts):
+    by_user, by_month = defaultdict(_Delta), defaultdict(_Delta)
+    for contract in contracts:
+        by_user[contract.user_id].add(-1, contract.amount, contract.fidelity)
+        by_month[month_of(contract.created_at)].add(-1, contract.amount, contract.fidelity)
+    with transaction.atomic(savepoint=False):
+        _apply(by_user, by_month, recompute_latest=True)
+
+
+def user_stats(user_id=None):
+    queryset = UserContractStats.objects.filter(contract_count__gt=0).order_by('user_id')
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    return queryset
+
+
+def monthly_stats(since=None, until=None):
+    queryset = MonthlyContractStats.objects.filter(contract_count__gt=0).order_by('month')
+    if since is not None:
+        queryset = queryset.filter(month__gte=since.replace(day=1))
+    if until is not None:
+        queryset = queryset.filter(month__lte=until)
+    return queryset
+
+
+@transaction.atomic
+def rebuild():
+    UserContractStats.objects.all().delete()
+    MonthlyContractStats.objects.all().delete()
+    totals = {
+        'contract_count': Count('id'),
+        'amount_sum': Coalesce(Sum('amount'), 0.0),
+        'fidelity_sum': Coalesce(Sum('fidelity'), 0),
+    }
+    UserContractStats.objects.bulk_create(
+        UserContractStats(**row)
+        for row in Contract.objects.order_by().values('user_id').annotate(
+            latest_created_at=Max('created_at'), **totals
+        )
+    )
+    MonthlyContractStats.objects.bulk_create(
+        MonthlyContractStats(**row)
+        for row in Contract.objects.order_by()
+        .annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values('month')
+        .annotate(**totals)
+    )
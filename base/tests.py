@@ -1,3 +1,1354 @@
-from django.test import TestCase
+import asyncio
+import gc
+import gzip
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import benchmarks, cost, imports, pubsub, rendering, search, stats
+from .db import ReadWriteRouter, request_routing
+from .documents import documents, query_hash
+from .filters import filter_contracts
+from .loaders import AsyncDataLoader, AsyncLoaders
+from .management.commands.profile_cold_start import parse_importtime
+from .models import User, Contract, ImportChunk, UserContractStats
+from .pagination import encode_cursor
+from .schema import schema
+from .tracing import TracingMiddleware, metrics
+from .views import GraphQLView
+
+
+def use_fixture_list_sizes(test):
+    """Cost every list as holding a few rows, like the test fixtures.
+
+    GRAPHQL_COST_LIST_SIZES budgets for production tables, which would
+    reject the whole-table queries tests make against a handful of rows.
+    """
+    patcher = mock.patch.dict(cost.LIST_SIZES, {coordinate: 20 for coordinate in cost.LIST_SIZES})
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+class GraphQLTestCase(TestCase):
+    fixture_list_sizes = True
+
+    def setUp(self):
+        cache.clear()
+        if self.fixture_list_sizes:
+            use_fixture_list_sizes(self)
+
+    def query(self, query, variables=None, **extra):
+        body = {'query': query}
+        if variables is not None:
+            body['variables'] = variables
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/graphql/', json.dumps(body), content_type='application/json', **extra
+            )
+        return response.json()
+
+    def create_contracts(self, users=3, contracts_per_user=4):
+        for i in range(users):
+            user = User.objects.create(name=f'User {i}', email=f'user{i}@example.com')
+            Contract.objects.bulk_create(
+                Contract(description=f'Contract {j}', user=user, fidelity=j, amount=10.0 * j)
+                for j in range(contracts_per_user)
+            )
+
+
+class DataLoaderTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_contracts()
+
+    def test_contract_users_are_batched(self):
+        result = self.query('{ contractsGql { id user { id name } } }')
+        self.assertEqual(len(result['data']['contractsGql']), 12)
+        self.assertEqual(result['extensions']['sqlQueries'], 1)
+
+    def test_nested_levels_cost_one_query_each(self):
+        result = self.query('{ contractsGql { user { contracts { id user { email } } } } }')
+        self.assertEqual(len(result['data']['contractsGql'][0]['user']['contracts']), 4)
+        self.assertEqual(result['extensions']['sqlQueries'], 2)
+
+    def test_mutation_payload_user_uses_loader(self):
+        contract = Contract.objects.first()
+        result = self.query(
+            'mutation { updateContractGql(input: {id: %d, amount: 1.5}) { contract { user { name } } } }'
+            % contract.id
+        )
+        self.assertEqual(
+            result['data']['updateContractGql']['contract']['user']['name'], contract.user.name
+        )
+
+    def test_user_contracts_are_batched(self):
+        result = self.query('{ usersGql { name contracts { amount } } }')
+        self.assertEqual([len(u['contracts']) for u in result['data']['usersGql']], [4, 4, 4])
+        self.assertEqual(result['extensions']['sqlQueries'], 2)
+
+
+class QueryPlannerTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=2, contracts_per_user=2)
+
+    def test_only_selected_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.query('{ contractsGql { id amount } }')
+        sql = queries.captured_queries[0]['sql']
+        self.assertIn('"amount"', sql)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_user_is_joined_only_when_selected(self):
+        contract = Contract.objects.first()
+        query = '{ getContractGql(input: {id: %d}) { id %s } }'
+        with CaptureQueriesContext(connection) as queries:
+            self.query(query % (contract.id, ''))
+            result = self.query(query % (contract.id, 'user { email }'))
+        self.assertNotIn('JOIN', queries.captured_queries[0]['sql'])
+        self.assertIn('JOIN', queries.captured_queries[1]['sql'])
+        self.assertEqual(result['data']['getContractGql']['user']['email'], contract.user.email)
+        self.assertEqual(result['extensions']['sqlQueries'], 1)
+
+    def test_contracts_are_prefetched_with_fragments(self):
+        result = self.query(
+            '{ usersGql { ...UserFields } } '
+            'fragment UserFields on UserType { name contracts { description } }'
+        )
+        self.assertEqual(len(result['data']['usersGql'][1]['contracts']), 2)
+        self.assertEqual(result['extensions']['sqlQueries'], 2)
+
+    def test_prefetched_and_loaded_contracts_share_one_order(self):
+        # Creation times that run against the ids, as in imported data.
+        for contract in Contract.objects.all():
+            created_at = datetime(2020, 1, 1, tzinfo=dt_timezone.utc) - timedelta(days=contract.pk)
+            Contract.objects.filter(pk=contract.pk).update(created_at=created_at)
+        stats.rebuild()
+        # Selecting createdAt makes the (user, created_at) index covering.
+        prefetched = self.query('{ usersGql { id contracts { id createdAt } } }')['data']['usersGql']
+        loaded = self.query('{ userContractStats { user { id contracts { id createdAt } } } }')
+        by_user = {row['user']['id']: row['user']['contracts'] for row in loaded['data']['userContractStats']}
+        for user in prefetched:
+            ids = [contract['id'] for contract in user['contracts']]
+            self.assertEqual(ids, sorted(ids, key=int))
+            self.assertEqual(user['contracts'], by_user[user['id']])
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    QUERY = """
+        query ($first: Int, $after: String) {
+            contractsConnectionGql(first: $first, after: $after) {
+                edges { cursor node { id amount } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=2, contracts_per_user=5)
+
+    def test_pages_walk_every_row_once(self):
+        ids, after = [], None
+        while True:
+            result = self.query(self.QUERY, {'first': 3, 'after': after})
+            connection = result['data']['contractsConnectionGql']
+            ids += [edge['node']['id'] for edge in connection['edges']]
+            self.assertEqual(result['extensions']['sqlQueries'], 1)
+            if not connection['pageInfo']['hasNextPage']:
+                break
+            after = connection['pageInfo']['endCursor']
+        self.assertEqual(ids, [str(pk) for pk in Contract.objects.order_by('created_at', 'id').values_list('id', flat=True)])
+
+    def test_page_size_is_capped(self):
+        result = self.query(self.QUERY, {'first': 10_000})
+        self.assertIn('first must be between', result['errors'][0]['message'])
+
+    def test_invalid_cursor_is_rejected(self):
+        result = self.query(self.QUERY, {'after': 'not-a-cursor'})
+        self.assertEqual(result['errors'][0]['message'], 'Invalid cursor.')
+
+    def test_deep_pages_seek_instead_of_offset(self):
+        last = Contract.objects.order_by('created_at', 'id')[7]
+        with CaptureQueriesContext(connection) as queries:
+            self.query(self.QUERY, {'first': 2, 'after': encode_cursor(last)})
+        self.assertNotIn('OFFSET', queries.captured_queries[0]['sql'])
+
+
+class BulkMutationTests(GraphQLTestCase):
+    CREATE = """
+        mutation ($input: [CreateContractInput!]!) {
+            createContractsBulk(input: $input) {
+                contracts { id user { email } }
+                errors { index message }
+                message
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=2, contracts_per_user=1)
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+        stats.rebuild()
+
+    def contract_input(self, user_id, amount=1.0):
+        return {'description': 'Bulk', 'userId': user_id, 'fidelity': 12, 'amount': amount}
+
+    def test_create_contracts_in_constant_queries(self):
+        counts = []
+        for size in (10, 50):
+            items = [self.contract_input(self.user_ids[i % 2], i) for i in range(size)]
+            result = self.query(self.CREATE, {'input': items})
+            payload = result['data']['createContractsBulk']
+            self.assertEqual(len(payload['contracts']), size)
+            self.assertEqual(payload['contracts'][1]['user']['email'], 'user1@example.com')
+            counts.append(result['extensions']['sqlQueries'])
+        self.assertEqual(Contract.objects.count(), 62)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_stats_are_upserted_once_however_many_users(self):
+        users = User.objects.bulk_create(User(name=f'Many {i}', email=f'many{i}@example.com') for i in range(20))
+        with CaptureQueriesContext(connection) as queries:
+            self.query(self.CREATE, {'input': [self.contract_input(user.id) for user in users]})
+        upserts = [query['sql'] for query in queries.captured_queries if 'contractstats' in query['sql']]
+        self.assertEqual(len(upserts), 2)
+        self.assertEqual(
+            list(stats.user_stats().filter(user__in=users).values_list('contract_count', flat=True)), [1] * 20
+        )
+
+    def test_invalid_item_rejects_whole_batch(self):
+        items = [self.contract_input(self.user_ids[0]), self.contract_input(999)]
+        payload = self.query(self.CREATE, {'input': items})['data']['createContractsBulk']
+        self.assertEqual(payload['errors'], [{'index': 1, 'message': "User don't exist."}])
+        self.assertEqual(Contract.objects.count(), 2)
+
+    def test_update_and_delete_contracts(self):
+        ids = list(Contract.objects.values_list('id', flat=True))
+        result = self.query(
+            'mutation ($input: [UpdateContractInput!]!) { updateContractsBulk(input: $input) '
+            '{ contracts { amount } errors { index } } }',
+            {'input': [{'id': pk, 'amount': 99.0} for pk in ids]},
+        )
+        self.assertEqual(result['data']['updateContractsBulk']['contracts'], [{'amount': 99.0}] * 2)
+        self.assertEqual(set(Contract.objects.values_list('amount', flat=True)), {99.0})
+
+        result = self.query(
+            'mutation ($input: [DeleteContractInput!]!) { deleteContractsBulk(input: $input) '
+            '{ deletedCount errors { index message } } }',
+            {'input': [{'id': pk} for pk in ids] + [{'id': ids[0]}]},
+        )
+        self.assertEqual(
+            result['data']['deleteContractsBulk']['errors'], [{'index': 2, 'message': 'Duplicate id in batch.'}]
+        )
+        result = self.query(
+            'mutation ($input: [DeleteContractInput!]!) { deleteContractsBulk(input: $input) { deletedCount } }',
+            {'input': [{'id': pk} for pk in ids]},
+        )
+        self.assertEqual(result['data']['deleteContractsBulk']['deletedCount'], 2)
+        self.assertFalse(Contract.objects.exists())
+
+    def test_create_users_reports_duplicate_emails(self):
+        query = (
+            'mutation ($input: [CreateUserInput!]!) { createUsersBulk(input: $input) '
+            '{ users { id } errors { index message } } }'
+        )
+        items = [
+            {'name': 'A', 'email': 'new@example.com'},
+            {'name': 'B', 'email': 'user0@example.com'},
+            {'name': 'C', 'email': 'new@example.com'},
+        ]
+        payload = self.query(query, {'input': items})['data']['createUsersBulk']
+        self.assertEqual([error['index'] for error in payload['errors']], [1, 2])
+        payload = self.query(query, {'input': items[:1]})['data']['createUsersBulk']
+        self.assertEqual(len(payload['users']), 1)
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    QUERY = '{ usersGql { id email } }'
+
+    def setUp(self):
+        super().setUp()
+        documents.clear()
+        self.create_contracts(users=1, contracts_per_user=0)
+
+    def persisted(self, sha256_hash, query=None):
+        body = {'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': sha256_hash}}}
+        if query:
+            body['query'] = query
+        return self.client.post('/graphql/', json.dumps(body), content_type='application/json').json()
+
+    def test_unknown_hash_asks_for_query(self):
+        result = self.persisted(query_hash(self.QUERY))
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+
+    def test_hash_only_request_after_registration(self):
+        sha256_hash = query_hash(self.QUERY)
+        self.persisted(sha256_hash, self.QUERY)
+        with mock.patch('base.documents.parse') as parse:
+            result = self.persisted(sha256_hash)
+        parse.assert_not_called()
+        self.assertEqual(result['data']['usersGql'][0]['email'], 'user0@example.com')
+
+    def test_hash_mismatch_is_rejected(self):
+        result = self.persisted('0' * 64, self.QUERY)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_HASH_MISMATCH')
+
+    def test_plain_queries_reuse_parsed_documents(self):
+        self.query(self.QUERY)
+        with mock.patch('base.documents.parse') as parse, mock.patch('base.documents.validate') as validate:
+            result = self.query(self.QUERY)
+        parse.assert_not_called()
+        validate.assert_not_called()
+        self.assertEqual(len(result['data']['usersGql']), 1)
+
+    def test_shared_backend_serves_other_processes(self):
+        sha256_hash = query_hash(self.QUERY)
+        with override_settings(CACHES={'apq': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with mock.patch('base.documents.PERSISTED_QUERY_CACHE', 'apq'):
+                self.persisted(sha256_hash, self.QUERY)
+                documents.clear()
+                result = self.persisted(sha256_hash)
+        self.assertEqual(len(result['data']['usersGql']), 1)
+
+
+class ResultCacheTests(GraphQLTestCase):
+    GET_CONTRACT = '{ getContractGql(input: {id: %d}) { amount user { name } } }'
+
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=1, contracts_per_user=2)
+        self.contract = Contract.objects.first()
+
+    def test_repeated_reads_skip_the_database(self):
+        first = self.query(self.GET_CONTRACT % self.contract.id)
+        second = self.query(self.GET_CONTRACT % self.contract.id)
+        self.assertEqual(first['data'], second['data'])
+        self.assertEqual(second['extensions']['sqlQueries'], 0)
+
+    def test_contract_mutation_invalidates_contract_and_owner(self):
+        by_user = '{ getContractsByUser(userId: %d) { amount } }' % self.contract.user_id
+        self.query(self.GET_CONTRACT % self.contract.id)
+        self.query(by_user)
+        self.query('mutation { updateContractGql(input: {id: %d, amount: 7.5}) { message } }' % self.contract.id)
+        result = self.query(self.GET_CONTRACT % self.contract.id)
+        self.assertEqual(result['data']['getContractGql']['amount'], 7.5)
+        self.assertIn({'amount': 7.5}, self.query(by_user)['data']['getContractsByUser'])
+
+    def test_user_mutation_invalidates_nested_user(self):
+        without_nested = '{ getContractWithoutNestedUserGql(input: {id: %d}) { user { name } } }' % self.contract.id
+        self.query(self.GET_CONTRACT % self.contract.id)
+        self.query(without_nested)
+        self.query('mutation { updateUserGql(input: {id: %d, name: "Renamed"}) { message } }' % self.contract.user_id)
+        result = self.query(self.GET_CONTRACT % self.contract.id)
+        self.assertEqual(result['data']['getContractGql']['user']['name'], 'Renamed')
+        result = self.query(without_nested)
+        self.assertEqual(result['data']['getContractWithoutNestedUserGql']['user']['name'], 'Renamed')
+
+    def test_missing_user_is_invalidated_by_creation(self):
+        query = '{ getUserGql(id: %d) { email } }' % (self.contract.user_id + 1)
+        self.assertIsNone(self.query(query)['data']['getUserGql'])
+        self.query('mutation { createUserGql(input: {name: "New", email: "new@example.com"}) { id } }')
+        self.assertEqual(self.query(query)['data']['getUserGql']['email'], 'new@example.com')
+
+    def test_hits_and_misses_are_exported_as_metrics(self):
+        metrics.clear()
+        self.query(self.GET_CONTRACT % self.contract.id)
+        self.query(self.GET_CONTRACT % self.contract.id)
+        self.query(self.GET_CONTRACT % self.contract.id)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('graphql_result_cache_lookups_total{result="miss"} 1', body)
+        self.assertIn('graphql_result_cache_lookups_total{result="hit"} 2', body)
+
+
+class ContractStatsTests(GraphQLTestCase):
+    STATS = """
+        {
+            userContractStats { userId contractCount amountSum fidelityAvg latestCreatedAt }
+            contractStatsByMonth { month contractCount amountSum fidelityAvg }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(name='Stats', email='stats@example.com')
+
+    def create(self, amount, fidelity):
+        result = self.query(
+            'mutation ($input: CreateContractInput!) { createContractGql(input: $input) { contract { id } } }',
+            {'input': {'description': 'x', 'userId': self.user.id, 'fidelity': fidelity, 'amount': amount}},
+        )
+        return result['data']['createContractGql']['contract']['id']
+
+    def test_mutations_keep_summaries_in_sync(self):
+        first = self.create(10.0, 12)
+        second = self.create(30.0, 24)
+        self.query('mutation { updateContractGql(input: {id: %s, amount: 20.0}) { message } }' % first)
+        self.query('mutation { deleteContractGql(input: {id: %s}) { message } }' % second)
+
+        result = self.query(self.STATS)
+        user_stats = result['data']['userContractStats']
+        self.assertEqual(len(user_stats), 1)
+        self.assertEqual(user_stats[0]['contractCount'], 1)
+        self.assertEqual(user_stats[0]['amountSum'], 20.0)
+        self.assertEqual(user_stats[0]['fidelityAvg'], 12.0)
+        self.assertEqual(result['data']['contractStatsByMonth'][0]['amountSum'], 20.0)
+        self.assertEqual(result['extensions']['sqlQueries'], 2)
+
+    def test_bulk_mutations_and_rebuild_agree(self):
+        self.create_contracts(users=3, contracts_per_user=4)
+        self.query(
+            'mutation ($input: [CreateContractInput!]!) { createContractsBulk(input: $input) { message } }',
+            {'input': [{'description': 'b', 'userId': self.user.id, 'fidelity': 6, 'amount': 5.0}] * 3},
+        )
+        stats.rebuild()
+        self.create(1.0, 1)
+        incremental = self.query(self.STATS)['data']
+        call_command('rebuild_contract_stats', stdout=StringIO())
+        self.assertEqual(self.query(self.STATS)['data'], incremental)
+
+
+class AsyncViewTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=3, contracts_per_user=2)
+
+    async def aquery(self, query, variables=None):
+        body = {'query': query}
+        if variables is not None:
+            body['variables'] = variables
+        response = await self.async_client.post(
+            '/graphql/async/', json.dumps(body), content_type='application/json'
+        )
+        return response.json()
+
+    async def test_matches_sync_results(self):
+        query = """
+            {
+                usersGql { email contracts { amount } }
+                contractsConnectionGql(first: 3) { edges { node { id user { name } } } }
+                userContractStats { contractCount }
+            }
+        """
+        expected = await sync_to_async(self.query)(query)
+        result = await self.aquery(query)
+        self.assertEqual(result['data'], expected['data'])
+
+    async def test_loader_batches_nested_users(self):
+        contract = await Contract.objects.afirst()
+        load_users = AsyncLoaders._load_users
+        with mock.patch.object(AsyncLoaders, '_load_users', autospec=True, side_effect=load_users) as batch:
+            result = await self.aquery(
+                'mutation { updateContractsBulk(input: [{id: %d, amount: 3.0}, {id: %d, amount: 4.0}]) '
+                '{ contracts { amount user { email } } } }' % (contract.id, contract.id + 2)
+            )
+        contracts = result['data']['updateContractsBulk']['contracts']
+        self.assertEqual([c['user']['email'] for c in contracts], ['user0@example.com', 'user1@example.com'])
+        batch.assert_called_once()
+
+    async def test_loader_keeps_its_dispatch_until_done(self):
+        async def double(keys):
+            await asyncio.sleep(0)
+            return [key * 2 for key in keys]
+
+        loader = AsyncDataLoader(double)
+        future = loader.load(1)
+        await asyncio.sleep(0)
+        gc.collect()
+        self.assertEqual(len(loader._dispatches), 1)
+        self.assertEqual(await future, 2)
+        await asyncio.sleep(0)
+        self.assertEqual(loader._dispatches, set())
+
+    async def test_keys_requested_during_their_batch_join_it(self):
+        release, batches = asyncio.Event(), []
+
+        async def double(keys):
+            batches.append(keys)
+            await release.wait()
+            return [key * 2 for key in keys]
+
+        loader = AsyncDataLoader(double)
+        first = loader.load(1)
+        while not batches:
+            await asyncio.sleep(0)
+        again = loader.load(1)
+        self.assertIs(again, first)
+        release.set()
+        self.assertEqual(await again, 2)
+        self.assertEqual(loader.load(1), 2)
+        self.assertEqual(batches, [(1,)])
+
+    async def test_cached_fields_work_async(self):
+        contract = await Contract.objects.afirst()
+        query = '{ getContractGql(input: {id: %d}) { amount user { name } } }' % contract.id
+        await self.aquery(query)
+        result = await self.aquery(query)
+        self.assertEqual(result['data']['getContractGql']['user']['name'], 'User 0')
+        self.assertEqual(result['extensions']['sqlQueries'], 0)
+
+
+class CostAnalysisTests(GraphQLTestCase):
+    # Costed with the configured list sizes, as in production.
+    fixture_list_sizes = False
+
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=1, contracts_per_user=1)
+
+    def test_aliased_full_table_scans_are_rejected_unexecuted(self):
+        fields = ' '.join(f'c{i}: contractsGql {{ user {{ name }} }}' for i in range(50))
+        with CaptureQueriesContext(connection) as queries:
+            result = self.query('{ %s }' % fields)
+        self.assertIsNone(result.get('data'))
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_COSTLY')
+        self.assertEqual(len(queries), 0)
+
+    def test_deep_nesting_is_rejected(self):
+        query = 'user { contracts { ' * 6 + 'id' + ' } }' * 6
+        result = self.query('{ contractsGql { %s } }' % query)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_DEEP')
+
+    def test_cost_follows_page_size_and_is_reported(self):
+        result = self.query(
+            'query($first: Int) { contractsConnectionGql(first: $first) { edges { node { user { name } } } } }',
+            {'first': 5},
+        )
+        # connection 1 + 5 edges * (edge 1 + node 1 + user 1)
+        self.assertEqual(result['extensions']['cost']['requested'], 16)
+        self.assertEqual(len(result['data']['contractsConnectionGql']['edges']), 1)
+
+    def test_skipped_selections_are_free(self):
+        result = self.query('{ contractsGql @skip(if: true) { id } usersGql { id } }')
+        self.assertEqual(result['extensions']['cost']['requested'], cost.LIST_SIZES['Query.usersGql'])
+
+    def test_whole_table_lists_fit_the_budget_only_flat_and_alone(self):
+        self.assertEqual(len(self.query('{ contractsGql { id } }')['data']['contractsGql']), 1)
+        for query in [
+            '{ %s }' % ' '.join(f'c{i}: contractsGql {{ id }}' for i in range(50)),
+            '{ contractsGql { description user { name email } } }',
+            '{ usersGql { contracts { id } } }',
+        ]:
+            with self.subTest(query[:40]), CaptureQueriesContext(connection) as queries:
+                result = self.query(query)
+            self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_COSTLY')
+            self.assertEqual(len(queries), 0)
+
+
+class ApiProfileTests(GraphQLTestCase):
+    def test_api_urlconf_serves_queries_with_lazy_schema(self):
+        self.create_contracts(users=1, contracts_per_user=1)
+        with override_settings(ROOT_URLCONF='power2go.urls_api'):
+            result = self.query('{ usersGql { email contracts { amount } } }')
+            admin = self.client.get('/admin/')
+        self.assertEqual(result['data']['usersGql'][0]['email'], 'user0@example.com')
+        self.assertEqual(admin.status_code, 404)
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   base.cost\n'
+            'import time:      2500 |       2620 | base.views\n'
+        )
+        self.assertEqual(parse_importtime(output), {'base.cost': (120, 120), 'base.views': (2500, 2620)})
+
+
+class ReadReplicaTests(TransactionTestCase):
+    # TestCase keeps every test in a transaction, which the router serves
+    # from the primary; committed data is needed to reach the replica.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        use_fixture_list_sizes(self)
+        user = User.objects.create(name='User 0', email='user0@example.com')
+        self.contract = Contract.objects.create(description='Contract', user=user, fidelity=1, amount=10.0)
+
+    def query(self, query):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                response = self.client.post(
+                    '/graphql/', json.dumps({'query': query}), content_type='application/json'
+                )
+        return response.json(), len(primary), len(replica)
+
+    def test_queries_read_from_replica(self):
+        result, primary, replica = self.query('{ contractsGql { amount user { email } } }')
+        self.assertEqual(result['data']['contractsGql'][0]['user']['email'], 'user0@example.com')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_mutations_read_their_writes_from_primary(self):
+        result, primary, replica = self.query(
+            'mutation { updateContractGql(input: {id: %d, amount: 25.0}) '
+            '{ contract { amount user { email } } } }' % self.contract.id
+        )
+        self.assertEqual(result['data']['updateContractGql']['contract']['amount'], 25.0)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_writes_pin_the_rest_of_the_request(self):
+        db_router = ReadWriteRouter()
+        self.assertEqual(db_router.db_for_read(Contract), 'default')
+        with request_routing():
+            self.assertEqual(db_router.db_for_read(Contract), 'replica')
+            Contract.objects.filter(pk=self.contract.pk).update(amount=5.0)
+            self.assertEqual(db_router.db_for_read(Contract), 'default')
+        with request_routing():
+            self.assertEqual(db_router.db_for_read(Contract), 'replica')
+
+    def test_connection_pragmas(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        with connections['replica'].cursor() as cursor:
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class BenchmarkTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        call_command('seed_benchmark_data', users=5, contracts=40, stdout=StringIO())
+
+    def test_seeding_spreads_rows_and_builds_stats(self):
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Contract.objects.count(), 40)
+        self.assertEqual(sum(UserContractStats.objects.values_list('contract_count', flat=True)), 40)
+        self.assertGreater(Contract.objects.dates('created_at', 'month').count(), 1)
+
+    def test_checked_in_database_is_refused(self):
+        with mock.patch.dict(connections['default'].settings_dict, NAME=benchmarks.TRACKED_DATABASE):
+            for command in ('seed_benchmark_data', 'benchmark_graphql', 'benchmark_response_rendering'):
+                with self.subTest(command), self.assertRaisesMessage(CommandError, 'checked-in db.sqlite3'):
+                    call_command(command, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 5)
+
+    def test_seeded_rows_paginate_like_orm_rows(self):
+        query = (
+            'query($after: String) { contractsConnectionGql(first: 15, after: $after) '
+            '{ edges { node { id } } pageInfo { endCursor hasNextPage } } }'
+        )
+        ids, after = [], None
+        while True:
+            page = self.query(query, {'after': after})['data']['contractsConnectionGql']
+            ids += [edge['node']['id'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        expected = Contract.objects.order_by('pk').values_list('pk', flat=True)
+        self.assertEqual(sorted(ids, key=int), [str(pk) for pk in expected])
+
+    def test_every_field_has_a_scenario_that_runs(self):
+        self.assertEqual(benchmarks.missing_scenarios(schema), [])
+        data = benchmarks.BenchmarkData()
+        for name in benchmarks.SCENARIOS:
+            with self.subTest(name):
+                result = benchmarks.run_scenario(name, data, requests=2, concurrency=1)
+                self.assertEqual(result['errors'], 0)
+                self.assertGreater(result['sqlQueriesPerOp'], 0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'scenarios': {'usersGql': {
+            'throughput': 100, 'p95Ms': 10, 'p99Ms': 20, 'sqlQueriesPerOp': 1, 'errors': 0,
+        }}}
+        results = {'scenarios': {'usersGql': {
+            'throughput': 95, 'p95Ms': 30, 'p99Ms': 21, 'sqlQueriesPerOp': 2, 'errors': 0,
+        }}}
+        regressions = benchmarks.compare(results, baseline, tolerance=0.1)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('p95Ms', regressions[0])
+        self.assertIn('SQL queries', regressions[1])
+
+
+class TracingTests(GraphQLTestCase):
+    QUERY = 'query Contracts { contractsGql { amount user { email contracts { id } } } }'
+
+    def setUp(self):
+        super().setUp()
+        metrics.clear()
+        self.create_contracts(users=2, contracts_per_user=3)
+
+    def test_trace_attributes_queries_to_field_paths(self):
+        result = self.query(self.QUERY, HTTP_X_GRAPHQL_TRACE='1')
+        fields = result['extensions']['tracing']['fields']
+        self.assertEqual(fields['contractsGql']['rows'], 6)
+        self.assertEqual(fields['contractsGql.user.contracts']['calls'], 6)
+        # The planned queryset prefetches the users' contracts, so both of
+        # the operation's queries belong to the root field.
+        self.assertEqual(fields['contractsGql']['sqlQueries'], 2)
+        self.assertEqual(result['extensions']['sqlQueries'], 2)
+        self.assertIn('SELECT', fields['contractsGql']['sql'][0]['sql'])
+
+    def test_untraced_requests_skip_the_middleware(self):
+        with mock.patch.object(TracingMiddleware, 'resolve') as resolve:
+            result = self.query(self.QUERY)
+        resolve.assert_not_called()
+        self.assertNotIn('tracing', result['extensions'])
+
+    def test_metrics_endpoint(self):
+        self.query(self.QUERY)
+        with mock.patch('base.tracing.SAMPLE_RATE', 1):
+            self.query(self.QUERY)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('graphql_operation_duration_seconds_count{operation="Contracts",type="query"} 2', body)
+        self.assertIn('graphql_field_sql_queries_total{operation="Contracts",path="contractsGql"} 2', body)
+        self.assertIn('# TYPE graphql_operation_sql_queries histogram', body)
+
+
+class ContractFilterTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=2, contracts_per_user=5)
+        self.user = User.objects.first()
+
+    def ids(self, field, args):
+        result = self.query('{ %s(%s) { id } }' % (field, args))
+        return result.get('errors') or [int(contract['id']) for contract in result['data'][field]]
+
+    def test_range_and_sort(self):
+        ids = self.ids('contractsGql', 'filter: {amount: {gte: 10, lte: 30}}, sort: AMOUNT_DESC')
+        expected = Contract.objects.filter(amount__range=(10, 30)).order_by('-amount', '-pk')
+        self.assertEqual(ids, [contract.id for contract in expected])
+
+    def test_user_and_created_at_range(self):
+        first, *_, last = Contract.objects.filter(user=self.user).order_by('created_at', 'pk')
+        ids = self.ids(
+            'getContractsByUser',
+            'userId: %d, filter: {createdAt: {lte: "%s"}}, sort: CREATED_AT_DESC'
+            % (self.user.id, last.created_at.isoformat()),
+        )
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(ids[-1], first.id)
+
+        result = self.query(
+            '{ contractsConnectionGql(first: 3, filter: {userId: %d}) { edges { node { user { id } } } } }'
+            % self.user.id
+        )
+        edges = result['data']['contractsConnectionGql']['edges']
+        self.assertEqual({edge['node']['user']['id'] for edge in edges}, {str(self.user.id)})
+
+    def test_unindexed_combinations_are_rejected(self):
+        for field, args in [
+            ('contractsGql', 'filter: {userId: %d, amount: {gte: 10}}' % self.user.id),
+            ('contractsGql', 'filter: {createdAt: {gte: "2020-01-01T00:00:00+00:00"}}, sort: AMOUNT_ASC'),
+            ('contractsGql', 'filter: {amount: {gte: 10}, fidelity: {lte: 3}}'),
+        ]:
+            with self.subTest(args):
+                result = self.query('{ %s(%s) { __typename } }' % (field, args))
+                self.assertEqual(result['errors'][0]['extensions']['code'], 'UNINDEXED_FILTER')
+
+    def test_connection_offers_only_keyset_filters(self):
+        result = self.query('{ contractsConnectionGql(filter: {fidelity: {gte: 1}}) { __typename } }')
+        self.assertIn('fidelity', result['errors'][0]['message'])
+        result = self.query(
+            '{ contractsConnectionGql(first: 2, filter: {userId: %d, createdAt: {gte: "2000-01-01T00:00:00Z"}}) '
+            '{ edges { node { id } } } }' % self.user.id
+        )
+        self.assertEqual(len(result['data']['contractsConnectionGql']['edges']), 2)
+
+    def test_accepted_combinations_use_an_index(self):
+        for filter, sort in [
+            ({'user_id': self.user.id, 'created_at': {'gte': self.user.created_at}}, '-created_at'),
+            ({'amount': {'gte': 10.0, 'lte': 20.0}}, 'amount'),
+            ({'fidelity': {'lte': 2}}, None),
+            ({}, '-fidelity'),
+        ]:
+            with self.subTest(filter=filter, sort=sort):
+                plan = filter_contracts(Contract.objects.all(), filter, sort).explain()
+                self.assertIn('USING INDEX', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ExportTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=2, contracts_per_user=3)
+
+    def test_ndjson_export_reuses_contract_filters(self):
+        response = self.client.get('/export/contracts', {'amount_gte': '10', 'sort': '-amount'})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['amount'] for row in rows], [20.0, 20.0, 10.0, 10.0])
+        self.assertEqual(set(rows[0]), {'id', 'description', 'user_id', 'fidelity', 'amount', 'created_at'})
+
+    def test_gzipped_csv_export(self):
+        response = self.client.get('/export/users', {'format': 'csv'}, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(lines[0], 'id,name,email,created_at')
+        self.assertEqual(len(lines), 3)
+
+    def test_refused_gzip_is_not_applied(self):
+        response = self.client.get('/export/users', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'{'))
+
+    def test_rows_are_streamed_in_chunks(self):
+        with mock.patch('base.exports.CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/export/contracts', {'format': 'csv'})
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(len(queries), 1)
+
+    def test_invalid_exports_are_rejected(self):
+        for path, params in [
+            ('/export/contracts', {'user_id': '1', 'amount_gte': '10'}),
+            ('/export/contracts', {'created_at_gte': 'yesterday'}),
+            ('/export/contracts', {'format': 'xml'}),
+        ]:
+            with self.subTest(params):
+                self.assertEqual(self.client.get(path, params).status_code, 400)
+        self.assertEqual(self.client.get('/export/payments').status_code, 404)
+
+
+class BatchedRequestTests(GraphQLTestCase):
+    STATS = '{ userContractStats { user { name } } }'
+
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=2, contracts_per_user=1)
+        stats.rebuild()
+        self.user = User.objects.first()
+
+    def batch(self, operations, path='/graphql/'):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(path, json.dumps(operations), content_type='application/json')
+        return response.json()
+
+    def test_operations_share_loaders(self):
+        results = self.batch([{'query': self.STATS, 'id': 'a'}, {'query': self.STATS, 'id': 'b'}])
+        self.assertEqual([result['id'] for result in results], ['a', 'b'])
+        self.assertEqual(results[0]['data'], results[1]['data'])
+        # The second operation finds both users in the shared loader.
+        self.assertEqual([result['extensions']['sqlQueries'] for result in results], [2, 1])
+
+    def test_mutations_reset_shared_loaders(self):
+        results = self.batch([
+            {'query': self.STATS},
+            {'query': 'mutation { updateUserGql(input: {id: %d, name: "Renamed"}) { message } }' % self.user.id},
+            {'query': self.STATS},
+        ])
+        names = [row['user']['name'] for row in results[2]['data']['userContractStats']]
+        self.assertIn('Renamed', names)
+
+    def test_async_view_batches(self):
+        results = self.batch([{'query': self.STATS}, {'query': '{ usersGql { id } }'}], '/graphql/async/')
+        self.assertEqual(len(results[1]['data']['usersGql']), 2)
+        self.assertEqual([result['status'] for result in results], [200, 200])
+
+    def test_batch_size_is_limited(self):
+        response = self.client.post('/graphql/', json.dumps([]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_cost_is_summed_before_any_operation_runs(self):
+        # Each operation is within the budget on its own (20 users at fixture sizes).
+        rename = {'query': 'mutation { updateUserGql(input: {id: %d, name: "Renamed"}) { message } }' % self.user.id}
+        operations = [rename] + [{'query': '{ usersGql { id } }'}] * 10
+        for path in ('/graphql/', '/graphql/async/'):
+            with self.subTest(path), mock.patch('base.views.MAX_BATCH_COST', 100):
+                response = self.client.post(path, json.dumps(operations), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    response.json()['errors'][0]['message'], 'Batch cost 201 exceeds the maximum of 100.'
+                )
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.name, 'Renamed')
+        self.assertEqual(len(self.batch(operations[:5])), 5)
+
+
+class ContractSearchTests(GraphQLTestCase):
+    SEARCH = """
+        query ($query: String!, $after: String) {
+            searchContracts(query: $query, first: 2, after: $after) {
+                edges { cursor node { id description user { name } } }
+                pageInfo { endCursor hasNextPage }
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(name='Search', email='search@example.com')
+
+    def search(self, query, after=None):
+        result = self.query(self.SEARCH, {'query': query, 'after': after})
+        return result, result.get('data') and result['data']['searchContracts']
+
+    def descriptions(self, query):
+        _, page = self.search(query)
+        return [edge['node']['description'] for edge in page['edges']]
+
+    def create(self, description):
+        result = self.query(
+            'mutation ($input: CreateContractInput!) { createContractGql(input: $input) { contract { id } } }',
+            {'input': {'description': description, 'userId': self.user.id, 'fidelity': 1, 'amount': 1.0}},
+        )
+        return result['data']['createContractGql']['contract']['id']
+
+    def test_results_are_ranked_and_paginated(self):
+        for description in ['wind farm', 'solar solar panels', 'solar roof', 'solar and wind', 'hydro']:
+            self.create(description)
+        result, page = self.search('Solar')
+        self.assertEqual(page['edges'][0]['node']['description'], 'solar solar panels')
+        self.assertEqual(page['edges'][0]['node']['user']['name'], 'Search')
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+        self.assertEqual(result['extensions']['sqlQueries'], 2)
+
+        _, rest = self.search('solar', page['pageInfo']['endCursor'])
+        self.assertEqual(len(rest['edges']), 1)
+        self.assertFalse(rest['pageInfo']['hasNextPage'])
+        seen = {edge['node']['id'] for edge in page['edges'] + rest['edges']}
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(self.descriptions('wind "farm'), ['wind farm'])
+
+    def test_mutations_keep_index_in_sync(self):
+        first = self.create('solar lease')
+        second = self.create('solar loan')
+        self.query('mutation { updateContractGql(input: {id: %s, description: "wind lease"}) { message } }' % first)
+        self.query('mutation { deleteContractGql(input: {id: %s}) { message } }' % second)
+        self.assertEqual(self.descriptions('solar'), [])
+        self.assertEqual(self.descriptions('lease'), ['wind lease'])
+
+        result = self.query(
+            'mutation ($input: [CreateContractInput!]!) { createContractsBulk(input: $input) { contracts { id } } }',
+            {'input': [
+                {'description': f'bulk {i}', 'userId': self.user.id, 'fidelity': 1, 'amount': 1.0} for i in range(3)
+            ]},
+        )
+        ids = [contract['id'] for contract in result['data']['createContractsBulk']['contracts']]
+        self.query(
+            'mutation ($input: [UpdateContractInput!]!) { updateContractsBulk(input: $input) { message } }',
+            {'input': [{'id': ids[0], 'description': 'renamed'}]},
+        )
+        self.query(
+            'mutation ($input: [DeleteContractInput!]!) { deleteContractsBulk(input: $input) { message } }',
+            {'input': [{'id': ids[1]}]},
+        )
+        self.assertEqual(self.descriptions('bulk'), ['bulk 2'])
+        self.assertEqual(self.descriptions('renamed'), ['renamed'])
+
+    def test_rebuild_indexes_rows_written_around_the_orm(self):
+        self.create_contracts(users=1, contracts_per_user=2)
+        self.assertEqual(self.descriptions('contract'), [])
+        call_command('rebuild_contract_search', stdout=StringIO())
+        self.assertEqual(sorted(self.descriptions('contract')), ['Contract 0', 'Contract 1'])
+
+    def test_invalid_queries_are_rejected(self):
+        result, _ = self.search('  "* ')
+        self.assertEqual(result['errors'][0]['message'], 'Search query must contain at least one word.')
+        result, _ = self.search('solar', 'bogus')
+        self.assertEqual(result['errors'][0]['message'], 'Invalid cursor.')
+
+
+class MutationRoundTripTests(GraphQLTestCase):
+    # Counts include the SAVEPOINT/RELEASE pair of each mutation's atomic
+    # block (BEGIN/COMMIT outside the test transaction). Failures that roll
+    # back add a ROLLBACK TO SAVEPOINT; a refused user delete adds the lookup
+    # that tells "has contracts" from "doesn't exist".
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(name='Owner', email='owner@example.com')
+        self.other = User.objects.create(name='Other', email='other@example.com')
+
+    def assertMutation(self, queries, mutation, expected):
+        with self.assertNumQueries(queries):
+            data = self.query('mutation { %s }' % mutation)['data']
+        self.assertEqual(next(iter(data.values())), expected)
+
+    def create_contract(self, description='solar', amount=10.0):
+        result = self.query(
+            'mutation { createContractGql(input: {description: "%s", userId: %d, fidelity: 12, amount: %s}) '
+            '{ contract { id } } }' % (description, self.user.id, amount)
+        )
+        return int(result['data']['createContractGql']['contract']['id'])
+
+    def test_user_mutations(self):
+        create = 'createUserGql(input: {name: "New", email: "%s"}) { name message }'
+        self.assertMutation(3, create % 'new@example.com', {'name': 'New', 'message': 'User created successfully'})
+        self.assertMutation(
+            4, create % 'owner@example.com', {'name': None, 'message': 'User with this email already exists.'}
+        )
+
+        update = 'updateUserGql(input: {id: %d, name: "Renamed"}) { user { name email } message }'
+        self.assertMutation(
+            1, update % self.user.id, {'user': {'name': 'Renamed', 'email': 'owner@example.com'}, 'message': None}
+        )
+        self.assertMutation(1, update % 0, {'user': None, 'message': "User don't exist."})
+
+        delete = 'deleteUserGql(input: {id: %d}) { successDeletion message }'
+        self.create_contract()
+        self.assertMutation(
+            4, delete % self.user.id,
+            {'successDeletion': False, 'message': 'User has contract(s) and cannot be deleted.'},
+        )
+        self.assertMutation(
+            4, delete % self.other.id, {'successDeletion': True, 'message': 'User deleted successfully.'}
+        )
+        self.assertMutation(4, delete % self.other.id, {'successDeletion': False, 'message': "User doesn't exist."})
+
+    def test_contract_mutations(self):
+        create = (
+            'createContractGql(input: {description: "wind", userId: %d, fidelity: 6, amount: 5.0}) '
+            '{ contract { description user { name } } message }'
+        )
+        self.create_contract()
+        # INSERT ... SELECT WHERE EXISTS, both stats UPDATEs, the search row
+        # and the payload's user.
+        self.assertMutation(
+            7, create % self.user.id,
+            {'contract': {'description': 'wind', 'user': {'name': 'Owner'}}, 'message': 'Contract created successfully.'},
+        )
+        self.assertMutation(4, create % 0, {'contract': None, 'message': "User don't exist."})
+
+        pk = self.create_contract()
+        update = 'updateContractGql(input: {id: %d, %s}) { contract { description amount } message }'
+        self.assertMutation(
+            5, update % (pk, 'amount: 20.0'),
+            {'contract': {'description': 'solar', 'amount': 20.0}, 'message': 'Contract updated successfully'},
+        )
+        self.assertMutation(
+            4, update % (pk, 'description: "hydro"'),
+            {'contract': {'description': 'hydro', 'amount': 20.0}, 'message': 'Contract updated successfully'},
+        )
+
+        delete = 'deleteContractGql(input: {id: %d}) { successDeletion message }'
+        self.assertMutation(
+            6, delete % pk, {'successDeletion': True, 'message': 'Contract deleted successfully.'}
+        )
+        self.assertMutation(4, delete % pk, {'successDeletion': False, 'message': "Contract don't exist."})
+
+        self.assertEqual(UserContractStats.objects.get(user=self.user).amount_sum, 15.0)
+        self.assertEqual(search.ranked_ids('hydro', 10), [])
+
+
+class WebSocketClient:
+    """Drives an ASGI WebSocket application in-process."""
+
+    def __init__(self, path='/graphql/', subprotocols=('graphql-transport-ws',)):
+        from power2go.asgi import application
+
+        self.incoming, self.outgoing = asyncio.Queue(), asyncio.Queue()
+        scope = {'type': 'websocket', 'path': path, 'subprotocols': list(subprotocols), 'headers': []}
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+        self.task = asyncio.create_task(application(scope, self.incoming.get, self.outgoing.put))
+
+    async def send(self, message):
+        await self.incoming.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self):
+        event = await asyncio.wait_for(self.outgoing.get(), 5)
+        return json.loads(event['text']) if event['type'] == 'websocket.send' else event
+
+    async def connect(self):
+        await self.receive()  # websocket.accept
+        await self.send({'type': 'connection_init'})
+        return await self.receive()
+
+    async def close(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+class SubscriptionTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(name='Owner', email='owner@example.com')
+        self.other = User.objects.create(name='Other', email='other@example.com')
+
+    async def subscribe(self, client, query, channel):
+        await client.send({'type': 'subscribe', 'id': '1', 'payload': {'query': query}})
+        backend = pubsub.get_backend()
+        while channel not in backend._subscribers:
+            await asyncio.sleep(0)
+
+    async def mutate(self, query):
+        return await sync_to_async(self.query)('mutation { %s }' % query)
+
+    async def test_contract_events_carry_selected_fields(self):
+        client = WebSocketClient()
+        self.assertEqual(await client.connect(), {'type': 'connection_ack'})
+        await self.subscribe(
+            client,
+            'subscription { contractChanged(userId: %d) { action contractId contract { amount user { name } } } }'
+            % self.user.id,
+            pubsub.contract_channel(self.user.id),
+        )
+
+        async def event(mutation):
+            await self.mutate(mutation)
+            message = await client.receive()
+            self.assertEqual((message['type'], message['id']), ('next', '1'))
+            return message['payload']['data']['contractChanged']
+
+        create = 'createContractGql(input: {description: "x", userId: %d, fidelity: 1, amount: 2.0}) { message }'
+        await self.mutate(create % self.other.id)
+        created = await event(create % self.user.id)
+        pk = created['contractId']
+        self.assertEqual(created, {
+            'action': 'CREATED', 'contractId': pk, 'contract': {'amount': 2.0, 'user': {'name': 'Owner'}},
+        })
+        updated = await event('updateContractGql(input: {id: %s, amount: 3.0}) { message }' % pk)
+        self.assertEqual(updated['contract']['amount'], 3.0)
+        deleted = await event('deleteContractGql(input: {id: %s}) { message }' % pk)
+        self.assertEqual(deleted, {'action': 'DELETED', 'contractId': pk, 'contract': None})
+
+        await client.send({'type': 'complete', 'id': '1'})
+        await client.close()
+        self.assertNotIn(pubsub.contract_channel(self.user.id), pubsub.get_backend()._subscribers)
+
+    async def test_user_events(self):
+        client = WebSocketClient('/graphql/async/')
+        await client.connect()
+        await self.subscribe(
+            client, 'subscription { userChanged(id: %d) { action user { name } } }' % self.user.id,
+            pubsub.user_channel(self.user.id),
+        )
+        await self.mutate('updateUserGql(input: {id: %d, name: "Renamed"}) { message }' % self.user.id)
+        message = await client.receive()
+        self.assertEqual(message['payload']['data']['userChanged'], {'action': 'UPDATED', 'user': {'name': 'Renamed'}})
+        await client.close()
+
+    async def test_protocol(self):
+        client = WebSocketClient()
+        await client.connect()
+        await client.send({'type': 'ping'})
+        self.assertEqual(await client.receive(), {'type': 'pong'})
+        await client.send({'type': 'subscribe', 'id': 'q', 'payload': {'query': '{ usersGql { name } }'}})
+        self.assertEqual(len((await client.receive())['payload']['data']['usersGql']), 2)
+        self.assertEqual(await client.receive(), {'type': 'complete', 'id': 'q'})
+        await client.send({'type': 'subscribe', 'id': 'e', 'payload': {'query': 'subscription { nope }'}})
+        message = await client.receive()
+        self.assertEqual((message['type'], message['id']), ('error', 'e'))
+        await client.send({'type': 'connection_init'})
+        self.assertEqual((await client.receive())['code'], 4429)
+
+        client = WebSocketClient()
+        await client.receive()
+        await client.send({'type': 'subscribe', 'id': '1', 'payload': {'query': '{ usersGql { id } }'}})
+        self.assertEqual((await client.receive())['code'], 4401)
+
+        client = WebSocketClient(subprotocols=())
+        self.assertEqual((await client.receive())['code'], 4406)
+
+    async def test_slow_subscribers_are_ended(self):
+        backend = pubsub.LocalBackend(queue_size=1)
+        stream = backend.subscribe('contracts')
+        pending = asyncio.ensure_future(stream.__anext__())
+        while 'contracts' not in backend._subscribers:
+            await asyncio.sleep(0)
+        backend.publish('contracts', {'n': 1})
+        self.assertEqual(await pending, {'n': 1})
+        for n in range(3):
+            backend.publish('contracts', {'n': n})
+        await asyncio.sleep(0)
+        with self.assertRaises(pubsub.SubscriberOverflowError):
+            await stream.__anext__()
+        self.assertNotIn('contracts', backend._subscribers)
+
+
+class ImportTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with (gzip.open if name.endswith('.gz') else open)(path, 'wt') as file:
+            file.write(text)
+        return path
+
+    def import_data(self, *args, **options):
+        stdout = StringIO()
+        call_command('import_data', *args, stdout=stdout, stderr=StringIO(), **options)
+        return stdout.getvalue()
+
+    def test_users_then_contracts(self):
+        users = self.write('users.csv.gz', (
+            'name,email,created_at\n'
+            'Ann,ann@example.com,2020-01-02T03:04:05Z\n'
+            'Bob,bob@example.com,\n'
+        ))
+        self.assertIn('Imported 2 users', self.import_data('users', users))
+        self.assertIn('2 already existed', self.import_data('users', users))
+        ann = User.objects.get(email='ann@example.com')
+        self.assertEqual(ann.created_at.isoformat(), '2020-01-02T03:04:05+00:00')
+
+        contracts = self.write('contracts.ndjson', '\n'.join(json.dumps(record) for record in [
+            {'description': 'Solar panels', 'user_email': 'ann@example.com', 'fidelity': 3, 'amount': 10.5,
+             'created_at': '2021-06-01 12:00:00'},
+            {'description': 'Heat pump', 'user_id': ann.id, 'fidelity': 1, 'amount': 4},
+        ]))
+        self.import_data('contracts', contracts)
+        self.assertEqual(
+            sorted(Contract.objects.values_list('description', 'user_id', 'amount')),
+            [('Heat pump', ann.id, 4.0), ('Solar panels', ann.id, 10.5)],
+        )
+        self.assertEqual(
+            Contract.objects.get(description='Solar panels').created_at.isoformat(), '2021-06-01T12:00:00+00:00'
+        )
+        self.assertEqual(UserContractStats.objects.get(user=ann).contract_count, 2)
+        self.assertEqual(len(search.ranked_ids('solar', 10)), 1)
+        self.assertFalse(ImportChunk.objects.exists())
+
+    def test_invalid_rows(self):
+        user = User.objects.create(name='Ann', email='ann@example.com')
+        path = self.write('contracts.csv', (
+            'description,user_email,fidelity,amount\n'
+            'Good,ann@example.com,1,2\n'
+            'Unknown owner,zed@example.com,1,2\n'
+            'Bad amount,ann@example.com,1,lots\n'
+        ))
+        with self.assertRaisesMessage(CommandError, 'Aborting after 1 invalid rows'):
+            self.import_data('contracts', path, restart=True)
+        self.assertFalse(user.contracts.exists())
+        output = self.import_data('contracts', path, restart=True, max_errors=2)
+        self.assertIn('skipped 2 invalid rows', output)
+        self.assertEqual(list(user.contracts.values_list('description', flat=True)), ['Good'])
+
+    def test_values_of_the_wrong_json_type_are_invalid_rows(self):
+        users = self.write('users.ndjson', '\n'.join(json.dumps(record) for record in [
+            {'name': 'Ann', 'email': 'ann@example.com'},
+            {'name': 'Bob', 'email': 5},
+            {'name': ['Cy'], 'email': 'cy@example.com'},
+        ]))
+        self.assertIn('skipped 2 invalid rows', self.import_data('users', users, max_errors=5))
+        contracts = self.write('contracts.ndjson', '\n'.join(json.dumps(record) for record in [
+            {'description': {'text': 'x'}, 'user_email': 'ann@example.com', 'fidelity': 1, 'amount': 1},
+            {'description': 'Owner', 'user_email': 7, 'fidelity': 1, 'amount': 1},
+            {'description': 'Flag', 'user_email': 'ann@example.com', 'fidelity': True, 'amount': 1},
+            {'description': 'Good', 'user_email': 'ann@example.com', 'fidelity': '2', 'amount': 1.5},
+        ]))
+        self.assertIn('skipped 3 invalid rows', self.import_data('contracts', contracts, max_errors=5))
+        self.assertEqual(list(Contract.objects.values_list('description', 'fidelity')), [('Good', 2)])
+
+    def test_resume_skips_committed_chunks(self):
+        User.objects.create(name='Ann', email='ann@example.com')
+        path = self.write('contracts.ndjson', '\n'.join(
+            json.dumps({'description': f'Contract {i}', 'user_email': 'ann@example.com', 'fidelity': i, 'amount': i})
+            for i in range(5)
+        ))
+        checkpoint = imports.Checkpoint('contracts', path, chunk_size=2)
+        checkpoint.complete(0, 2)
+        checkpoint.complete(2, 1)
+        output = self.import_data('contracts', path, chunk_size=2)
+        self.assertIn('Resuming: 2 chunks (3 rows) already imported.', output)
+        self.assertEqual(sorted(Contract.objects.values_list('fidelity', flat=True)), [2, 3])
+        self.assertFalse(ImportChunk.objects.exists())
+        with self.assertRaisesMessage(CommandError, 'used --chunk-size 2'):
+            checkpoint.complete(0, 2)
+            self.import_data('contracts', path, chunk_size=3)
+
+    def test_cached_missing_contracts_are_invalidated(self):
+        user = User.objects.create(name='Ann', email='ann@example.com')
+        next_id = Contract.objects.create(description='Old', user=user, fidelity=1, amount=1).pk + 1
+        query = '{ getContractGql(input: {id: %d}) { description } }' % next_id
+        self.assertIsNone(self.query(query)['data']['getContractGql'])
+        path = self.write('contracts.ndjson', json.dumps(
+            {'description': 'New', 'user_email': 'ann@example.com', 'fidelity': 1, 'amount': 1}
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_data('contracts', path)
+        self.assertEqual(self.query(query)['data']['getContractGql'], {'description': 'New'})
+
+    def test_chunk_and_checkpoint_commit_together(self):
+        User.objects.create(name='Ann', email='ann@example.com')
+        path = self.write('contracts.ndjson', '\n'.join(
+            json.dumps({'description': f'Contract {i}', 'user_email': 'ann@example.com', 'fidelity': i, 'amount': i})
+            for i in range(5)
+        ))
+        complete = imports.Checkpoint.complete
+
+        def crash_on_second_chunk(checkpoint, chunk, rows):
+            if chunk == 1:
+                raise RuntimeError('crash')
+            complete(checkpoint, chunk, rows)
+
+        with mock.patch.object(imports.Checkpoint, 'complete', crash_on_second_chunk):
+            with self.assertRaisesMessage(RuntimeError, 'crash'):
+                self.import_data('contracts', path, chunk_size=2)
+        self.assertEqual(sorted(Contract.objects.values_list('fidelity', flat=True)), [0, 1])
+        self.assertIn('Resuming: 1 chunks (2 rows)', self.import_data('contracts', path, chunk_size=2))
+        self.assertEqual(sorted(Contract.objects.values_list('fidelity', flat=True)), [0, 1, 2, 3, 4])
+
+
+class ResponseRenderingTests(GraphQLTestCase):
+    QUERY = json.dumps({'query': '{ contractsGql { id description amount createdAt } }'})
+
+    def setUp(self):
+        super().setUp()
+        self.create_contracts(users=2, contracts_per_user=10)
+
+    def post(self, path='/graphql/', accept_encoding='gzip, deflate, br'):
+        return self.client.post(
+            path, self.QUERY, content_type='application/json', headers={'Accept-Encoding': accept_encoding}
+        )
+
+    def test_large_responses_are_gzipped(self):
+        plain = self.post(accept_encoding='identity')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertGreater(len(plain.content), rendering.COMPRESS_MIN_SIZE)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        with mock.patch.object(rendering, 'brotli', None):
+            for path in ('/graphql/', '/graphql/async/'):
+                with self.subTest(path):
+                    response = self.post(path)
+                    self.assertEqual(response['Content-Encoding'], 'gzip')
+                    self.assertEqual(json.loads(gzip.decompress(response.content))['data'], plain.json()['data'])
+                    self.assertEqual(response['Content-Length'], str(len(response.content)))
+
+        self.assertNotIn('Content-Encoding', self.post(accept_encoding='br, gzip;q=0'))
+        with mock.patch.object(GraphQLView, 'compress_min_size', len(plain.content) + 1):
+            self.assertNotIn('Content-Encoding', self.post())
+
+    def test_brotli_is_preferred_when_installed(self):
+        brotli = mock.Mock(compress=mock.Mock(return_value=b'compressed'))
+        with mock.patch.object(rendering, 'brotli', brotli):
+            response = self.post()
+        self.assertEqual((response['Content-Encoding'], response.content), ('br', b'compressed'))
+
+    def test_encoder_fallback_matches_orjson(self):
+        data = {
+            'at': datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=dt_timezone.utc),
+            'day': date(2024, 5, 6),
+            'price': Decimal('12.50'),
+            'name': 'Zürich',
+            'nested': [{'n': 1}, None, True, 1.5],
+        }
+        encoded = rendering.dumps(data)
+        self.assertEqual(json.loads(encoded), {
+            'at': '2024-05-06T07:08:09.123456+00:00',
+            'day': '2024-05-06',
+            'price': '12.50',
+            'name': 'Zürich',
+            'nested': [{'n': 1}, None, True, 1.5],
+        })
+        with mock.patch.object(rendering, 'orjson', None):
+            self.assertEqual(json.loads(rendering.dumps(data)), json.loads(encoded))
+            self.assertIn('\n  "at"', rendering.dumps(data, pretty=True))
+        self.assertEqual(rendering.dumps({'big': 2 ** 70}), '{"big":%d}' % 2 ** 70)
+
+    def test_graphiql_only_for_browser_gets(self):
+        html = {'Accept': 'text/html'}
+        self.assertIn(b'graphiql', self.client.get('/graphql/', headers=html).content.lower())
+        response = self.client.post('/graphql/', self.QUERY, content_type='application/json', headers=html)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(response.json()['data']['contractsGql']), 20)
@@ -0,0 +1,276 @@
+import inspect
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models.query import QuerySet
+
+SAMPLE_RATE = getattr(settings, 'GRAPHQL_TRACE_SAMPLE_RATE', 0.01)
+TRACE_HEADER = getattr(settings, 'GRAPHQL_TRACE_HEADER', 'X-GraphQL-Trace')
+MAX_STATEMENTS = 10
+MAX_SERIES = 1000
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Field path whose resolver is running, read by the SQL wrapper. Async
+# resolvers run their ORM calls in a copy of this context.
+_current_path = ContextVar('graphql_field_path', default=None)
+
+
+def field_path(info):
+    """``info.path`` without list indices, e.g. ``contractsGql.user.name``."""
+    return '.'.join(key for key in info.path.as_list() if isinstance(key, str))
+
+
+class _FieldStats:
+    __slots__ = ('calls', 'ns', 'max_ns', 'queries', 'sql_ns', 'rows', 'statements')
+
+    def __init__(self):
+        self.calls = self.ns = self.max_ns = self.queries = self.sql_ns = self.rows = 0
+        self.statements = {}
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'totalMs': round(self.ns / 1e6, 3),
+            'maxMs': round(self.max_ns / 1e6, 3),
+            'sqlQueries': self.queries,
+            'sqlMs': round(self.sql_ns / 1e6, 3),
+            'rows': self.rows,
+            'sql': [
+                {'sql': sql, 'count': count, 'totalMs': round(ns / 1e6, 3)}
+                for sql, (count, ns) in self.statements.items()
+            ],
+        }
+
+
+class Trace:
+    """Per-field timings, SQL and rows of one sampled operation.
+
+    Installed both as a database execute wrapper and, through
+    ``TracingMiddleware``, around every resolver. ``report`` is set when
+    the client asked for the trace in the response.
+    """
+
+    def __init__(self, report=False):
+        self.report = report
+        self.fields = {}
+        self.start = time.perf_counter_ns()
+
+    def _field(self, path):
+        stats = self.fields.get(path)
+        if stats is None:
+            stats = self.fields[path] = _FieldStats()
+        return stats
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            stats = self._field(_current_path.get() or '(operation)')
+            stats.queries += 1
+            stats.sql_ns += elapsed
+            count, ns = stats.statements.get(sql, (0, 0))
+            if count or len(stats.statements) < MAX_STATEMENTS:
+                stats.statements[sql] = (count + 1, ns + elapsed)
+
+    def record(self, path, start, value):
+        elapsed = time.perf_counter_ns() - start
+        stats = self._field(path)
+        stats.calls += 1
+        stats.ns += elapsed
+        stats.max_ns = max(stats.max_ns, elapsed)
+        if isinstance(value, (list, tuple)):
+            stats.rows += len(value)
+
+    def as_extension(self):
+        return {
+            'durationMs': round((time.perf_counter_ns() - self.start) / 1e6, 3),
+            'fields': {path: stats.as_dict() for path, stats in self.fields.items()},
+        }
+
+
+class TracingMiddleware:
+    def __init__(self, trace):
+        self.trace = trace
+
+    def resolve(self, next, root, info, **args):
+        path = field_path(info)
+        start = time.perf_counter_ns()
+        token = _current_path.set(path)
+        try:
+            value = next(root, info, **args)
+            if inspect.isawaitable(value):
+                return self._resolve_async(value, path, start)
+            if isinstance(value, QuerySet):
+                # Evaluated here, the query is attributed to this field
+                # rather than to whichever field runs next.
+                value = list(value)
+        finally:
+            _current_path.reset(token)
+        self.trace.record(path, start, value)
+        return value
+
+    async def _resolve_async(self, value, path, start):
+        token = _current_path.set(path)
+        try:
+            value = await value
+        finally:
+            _current_path.reset(token)
+        self.trace.record(path, start, value)
+        return value
+
+
+def start_trace(request):
+    """Return a ``Trace`` if this request is traced, else ``None``.
+
+    Requests carrying ``GRAPHQL_TRACE_HEADER`` are always traced and get the
+    trace back in ``extensions``; others are sampled at
+    ``GRAPHQL_TRACE_SAMPLE_RATE`` into the metrics only.
+    """
+    if request.headers.get(TRACE_HEADER):
+        return Trace(report=True)
+    if SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        return Trace()
+    return None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class _Metric:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+
+    def _key(self, labels):
+        if labels not in self.series and len(self.series) >= MAX_SERIES:
+            return ('other',) * len(labels)
+        return labels
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, labels, value=1):
+        key = self._key(labels)
+        self.series[key] = self.series.get(key, 0) + value
+
+    def samples(self):
+        for labels, value in self.series.items():
+            yield f'{self.name}{{{_labels(self.labels, labels)}}} {value}'
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * len(self.buckets), 0, 0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += 1
+        series[2] += value
+
+    def samples(self):
+        for labels, (buckets, count, total) in self.series.items():
+            base = _labels(self.labels, labels)
+            for bound, bucket_count in zip(self.buckets, buckets):
+                yield f'{self.name}_bucket{{{base},le="{bound}"}} {bucket_count}'
+            yield f'{self.name}_bucket{{{base},le="+Inf"}} {count}'
+            yield f'{self.name}_count{{{base}}} {count}'
+            yield f'{self.name}_sum{{{base}}} {total}'
+
+
+class Metrics:
+    """In-process registry rendered in the Prometheus text format.
+
+    Operation histograms cover every request; field counters only the
+    sampled ones. Each worker process keeps its own registry.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        operation = ('operation', 'type')
+        self.duration = Histogram(
+            'graphql_operation_duration_seconds', 'GraphQL operation wall time.', operation, DURATION_BUCKETS
+        )
+        self.queries = Histogram(
+            'graphql_operation_sql_queries', 'SQL queries per GraphQL operation.', operation, QUERY_BUCKETS
+        )
+        field = ('operation', 'path')
+        self.field_seconds = Counter(
+            'graphql_field_seconds_total', 'Resolver wall time of sampled operations.', field
+        )
+        self.field_queries = Counter(
+            'graphql_field_sql_queries_total', 'SQL queries of sampled operations, by field path.', field
+        )
+        self.field_rows = Counter(
+            'graphql_field_rows_total', 'List items returned by resolvers of sampled operations.', field
+        )
+        self.result_cache = Counter(
+            'graphql_result_cache_lookups_total', 'Result cache lookups by outcome (hit, miss, oversized).', ('result',)
+        )
+
+    def observe(self, operation_ast, seconds, queries, trace=None):
+        if operation_ast is None:
+            return
+        name = operation_ast.name.value if operation_ast.name else 'anonymous'
+        labels = (name, operation_ast.operation.value)
+        with self.lock:
+            self.duration.observe(labels, seconds)
+            self.queries.observe(labels, queries)
+            if trace is None:
+                return
+            for path, stats in trace.fields.items():
+                field = (name, path)
+                self.field_seconds.inc(field, stats.ns / 1e9)
+                if stats.queries:
+                    self.field_queries.inc(field, stats.queries)
+                if stats.rows:
+                    self.field_rows.inc(field, stats.rows)
+
+    def count_cache_lookup(self, result):
+        with self.lock:
+            self.result_cache.inc((result,))
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.all():
+                lines.append(f'# HELP {metric.name} {metric.help}')
+                lines.append(f'# TYPE {metric.name} {metric.type}')
+                lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def all(self):
+        return (
+            self.duration, self.queries, self.field_seconds, self.field_queries, self.field_rows, self.result_cache
+        )
+
+    def clear(self):
+        with self.lock:
+            for metric in self.all():
+                metric.series.clear()
+
+
+metrics = Metrics()
@@ -1,3 +1,432 @@
-from django.shortcuts import render
+import inspect
+import json
+import time
+from contextlib import AsyncExitStack, ExitStack
 
-# Create your views here.
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.module_loading import import_string
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView as BaseGraphQLView, HttpError
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    validate_schema,
+)
+
+from .cost import MAX_BATCH_COST, analyze, check_cost
+from .db import acount_queries, awrap_queries, count_queries, pin_primary, request_routing, wrap_queries
+from .documents import get_document, persisted_query_hash
+from .exports import EXPORTS, FORMATS, export_rows, gzipped
+from .loaders import AsyncLoaders, Loaders
+from .rendering import COMPRESS_MIN_SIZE, accepted_encodings, compress, dumps
+from .tracing import TracingMiddleware, metrics, start_trace
+
+
+MAX_BATCH_SIZE = getattr(settings, 'GRAPHQL_MAX_BATCH_SIZE', 50)
+
+
+def is_mutation(operation_ast):
+    return operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+
+
+class GraphQLView(BaseGraphQLView):
+    # Responses at least this large are compressed; None disables it.
+    compress_min_size = COMPRESS_MIN_SIZE
+
+    def __init__(self, schema=None, **kwargs):
+        # A dotted path defers building the schema to the first request.
+        if isinstance(schema, str):
+            schema = import_string(schema)
+        super().__init__(schema=schema, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        with request_routing():
+            response = super().dispatch(request, *args, **kwargs)
+        return compress(request, response, self.compress_min_size)
+
+    @classmethod
+    def can_display_graphiql(cls, request, data):
+        # API clients POST; only a browser's GET can want the IDE, so other
+        # requests skip parsing the Accept header for it.
+        return request.method == 'GET' and super().can_display_graphiql(request, data)
+
+    def json_encode(self, request, d, pretty=False):
+        return dumps(d, pretty=bool(self.pretty or pretty or request.GET.get('pretty')))
+
+    def get_context(self, request):
+        # One set of loaders serves every operation of a batched request,
+        # so lookups repeated across operations are fetched once.
+        if getattr(request, 'loaders', None) is None:
+            request.loaders = Loaders()
+        return request
+
+    def parse_body(self, request):
+        # A JSON array is a batch of operations, whether or not the view was
+        # created with batch=True; a JSON object is a single operation.
+        if self.get_content_type(request) != 'application/json':
+            return super().parse_body(request)
+        try:
+            data = json.loads(request.body)
+        except (TypeError, ValueError):
+            raise HttpError(HttpResponseBadRequest('POST body sent invalid JSON.'))
+
+        if isinstance(data, list):
+            if not data or len(data) > MAX_BATCH_SIZE:
+                raise HttpError(HttpResponseBadRequest(
+                    f'A batch must hold between 1 and {MAX_BATCH_SIZE} operations.'
+                ))
+            if not all(isinstance(entry, dict) for entry in data):
+                raise HttpError(HttpResponseBadRequest('The received data is not a valid JSON query.'))
+            self.check_batch_cost(request, data)
+            self.batch = True
+        elif not isinstance(data, dict):
+            raise HttpError(HttpResponseBadRequest('The received data is not a valid JSON query.'))
+        return data
+
+    def check_batch_cost(self, request, data):
+        """Reject a batch whose operations together exceed ``MAX_BATCH_COST``.
+
+        Each operation is held to ``MAX_COST`` when it runs; this bounds the
+        request as a whole, before any of its operations execute. Operations
+        that fail to parse or validate are answered with their own errors and
+        cost nothing here.
+        """
+        schema = self.schema.graphql_schema
+        total = 0
+        for entry in data:
+            query, variables, operation_name, _ = self.get_graphql_params(request, entry)
+            try:
+                sha256_hash = persisted_query_hash(self.get_extensions(request, entry))
+                document, errors = get_document(self.schema, query, sha256_hash, self.validation_rules)
+            except GraphQLError:
+                continue
+            analysis = None if errors else analyze(schema, document, operation_name, variables)
+            if analysis is not None:
+                total += analysis[0]
+        if total > MAX_BATCH_COST:
+            raise HttpError(HttpResponseBadRequest(), f'Batch cost {total} exceeds the maximum of {MAX_BATCH_COST}.')
+
+    def get_middleware(self, request):
+        middleware = list(super().get_middleware(request) or [])
+        if getattr(request, 'trace', None) is not None:
+            middleware.append(TracingMiddleware(request.trace))
+        return middleware
+
+    def get_extensions(self, request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        return extensions
+
+    def execute_graphql_request(self, request, data, query, *args, **kwargs):
+        request.operation_ast = None
+        request.trace = trace = start_trace(request)
+        start = time.perf_counter()
+        with count_queries() as counter, ExitStack() as stack:
+            if trace is not None:
+                stack.enter_context(wrap_queries(trace))
+            result = self.execute_document(request, data, query, *args, **kwargs)
+        return self.finish_request(request, result, time.perf_counter() - start, counter.count)
+
+    def finish_request(self, request, result, seconds, queries):
+        """Record the operation's metrics and add its response extensions."""
+        trace = request.trace
+        metrics.observe(getattr(request, 'operation_ast', None), seconds, queries, trace)
+        extensions = {'sqlQueries': queries}
+        if trace is not None and trace.report:
+            extensions['tracing'] = trace.as_extension()
+        return self.with_extensions(result, extensions)
+
+    def with_extensions(self, result, extensions):
+        if result is not None and extensions:
+            result.extensions = {**(result.extensions or {}), **extensions}
+        return result
+
+    def prepare_execution(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """Resolve, parse and validate the document to run.
+
+        Returns ``(result, options)``: ``options`` are the ``execute()``
+        arguments, or ``None`` when ``result`` already answers the request;
+        otherwise ``result`` only carries extensions for the final response.
+        Operations over the cost or depth budget are answered here, before
+        any resolver runs.
+        """
+        try:
+            sha256_hash = persisted_query_hash(self.get_extensions(request, data))
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e]), None
+
+        if not query and not sha256_hash:
+            if show_graphiql:
+                return None, None
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors), None
+
+        try:
+            document, validation_errors = get_document(
+                self.schema, query, sha256_hash, self.validation_rules
+            )
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e]), None
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == 'get'
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None, None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ['POST'],
+                    'Can only perform a {} operation from a POST request.'.format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors), None
+
+        cost, cost_error = check_cost(schema, document, operation_name, variables)
+        if cost_error:
+            return ExecutionResult(data=None, errors=[cost_error], extensions=cost), None
+
+        options = {
+            'schema': schema,
+            'document': document,
+            'root_value': self.get_root_value(request),
+            'context_value': self.get_context(request),
+            'variable_values': variables,
+            'operation_name': operation_name,
+            'middleware': self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            options['execution_context_class'] = self.execution_context_class
+        return ExecutionResult(extensions=cost), options
+
+    def execute_document(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        result, options = self.prepare_execution(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if options is None:
+            return result
+        operation_ast = self.begin_operation(request, options['document'], operation_name)
+
+        try:
+            if (
+                is_mutation(operation_ast)
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+                )
+            ):
+                with transaction.atomic():
+                    execution_result = execute(**options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+            else:
+                execution_result = execute(**options)
+        except Exception as e:
+            execution_result = ExecutionResult(errors=[e])
+        self.end_operation(request, operation_ast)
+        return self.with_extensions(execution_result, result.extensions)
+
+    def begin_operation(self, request, document, operation_name):
+        request.operation_ast = operation_ast = get_operation_ast(document, operation_name)
+        if is_mutation(operation_ast):
+            pin_primary()
+        return operation_ast
+
+    def end_operation(self, request, operation_ast):
+        # Later operations of a batch must not see loader entries a
+        # mutation may have made stale.
+        if is_mutation(operation_ast):
+            request.loaders = None
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.format_response(request, execution_result, id, show_graphiql)
+
+    def format_response(self, request, execution_result, id, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response['errors'] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, 'path', None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response['data'] = execution_result.data
+
+            if execution_result.extensions:
+                response['extensions'] = execution_result.extensions
+
+            if self.batch:
+                response['id'] = id
+                response['status'] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+
+class AsyncGraphQLView(GraphQLView):
+    """GraphQL endpoint for ASGI servers, executing ``async_schema``.
+
+    Resolvers may return awaitables, so independent root fields and loader
+    batches run concurrently. GraphiQL is left to the synchronous view.
+    """
+
+    view_is_async = True
+
+    def get_context(self, request):
+        if getattr(request, 'loaders', None) is None:
+            request.loaders = AsyncLoaders()
+        return request
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ['GET', 'POST'], 'GraphQL only supports GET and POST requests.'
+                    )
+                )
+
+            data = self.parse_body(request)
+            with request_routing():
+                if self.batch:
+                    # Operations run in order, so a mutation's writes are
+                    # visible to the operations after it.
+                    responses = [await self.get_async_response(request, entry) for entry in data]
+                    result = '[{}]'.format(','.join(response[0] for response in responses))
+                    status_code = max(response[1] for response in responses)
+                else:
+                    result, status_code = await self.get_async_response(request, data)
+            response = HttpResponse(
+                status=status_code, content=result, content_type='application/json'
+            )
+            return compress(request, response, self.compress_min_size)
+
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(
+                request, {'errors': [self.format_error(e)]}
+            )
+            return response
+
+    async def get_async_response(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        request.operation_ast = None
+        request.trace = trace = start_trace(request)
+        start = time.perf_counter()
+        async with acount_queries() as counter, AsyncExitStack() as stack:
+            if trace is not None:
+                await stack.enter_async_context(awrap_queries(trace))
+            execution_result = await self.aexecute_document(
+                request, data, query, variables, operation_name
+            )
+        execution_result = self.finish_request(
+            request, execution_result, time.perf_counter() - start, counter.count
+        )
+        return self.format_response(request, execution_result, id)
+
+    async def aexecute_document(self, request, data, query, variables, operation_name):
+        result, options = self.prepare_execution(
+            request, data, query, variables, operation_name
+        )
+        if options is None:
+            return result
+        operation_ast = self.begin_operation(request, options['document'], operation_name)
+
+        try:
+            execution_result = execute(**options)
+            if inspect.isawaitable(execution_result):
+                execution_result = await execution_result
+        except Exception as e:
+            execution_result = ExecutionResult(errors=[e])
+        self.end_operation(request, operation_ast)
+        return self.with_extensions(execution_result, result.extensions)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for the GraphQL operation metrics."""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4')
+
+
+def export_view(request, resource):
+    """Stream every row of ``resource`` as NDJSON (default) or CSV.
+
+    Contracts accept the GraphQL contract filters as query parameters.
+    Rows are read in chunks and written as they arrive, gzipped when the
+    client accepts it, so memory stays flat however large the export.
+    """
+    if resource not in EXPORTS:
+        raise Http404
+    format = request.GET.get('format', 'ndjson')
+    if format not in FORMATS:
+        return JsonResponse({'errors': [{'message': f'Unknown format {format!r}.'}]}, status=400)
+
+    try:
+        columns, rows = export_rows(resource, request.GET)
+    except (ValueError, GraphQLError) as e:
+        return JsonResponse({'errors': [{'message': str(e)}]}, status=400)
+
+    write, content_type = FORMATS[format]
+    chunks = write(columns, rows)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    accepted = accepted_encodings(request)
+    if 'gzip' in accepted or '*' in accepted:
+        response.streaming_content = gzipped(chunks)
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'attachment; filename="{resource}.{format}"'
+    return response
@@ -0,0 +1,188 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, subscribe
+
+from .cost import check_cost
+from .documents import get_document, persisted_query_hash
+from .loaders import AsyncLoaders
+
+PROTOCOL = 'graphql-transport-ws'
+CONNECTION_INIT_TIMEOUT = getattr(settings, 'GRAPHQL_WS_CONNECTION_INIT_TIMEOUT', 10)
+
+
+class Context:
+    """``info.context`` of operations run over a WebSocket."""
+
+    def __init__(self, scope, connection_params):
+        self.scope = scope
+        self.connection_params = connection_params
+        self.loaders = AsyncLoaders()
+
+
+class _Close(Exception):
+    def __init__(self, code, reason):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+class GraphQLWebSocket:
+    """ASGI application speaking the ``graphql-transport-ws`` protocol.
+
+    Serves subscriptions of ``async_schema`` (queries and mutations too, as
+    single results) with the same document cache, persisted queries and
+    cost limits as the HTTP views.
+    """
+
+    def __init__(self, schema='base.async_schema.async_schema'):
+        self._schema = schema
+
+    @property
+    def schema(self):
+        if isinstance(self._schema, str):
+            self._schema = import_string(self._schema)
+        return self._schema
+
+    async def __call__(self, scope, receive, send):
+        event = await receive()
+        if event['type'] != 'websocket.connect':
+            return
+        if PROTOCOL not in scope.get('subprotocols', ()):
+            await send({'type': 'websocket.close', 'code': 4406})
+            return
+        await send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+        await _Connection(self.schema, scope, send).run(receive)
+
+
+class _Connection:
+    def __init__(self, schema, scope, send):
+        self.schema = schema
+        self.scope = scope
+        self._send = send
+        self.connection_params = None
+        self.operations = {}
+
+    async def send(self, message):
+        await self._send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def run(self, receive):
+        try:
+            try:
+                event = await asyncio.wait_for(self.receive_message(receive), CONNECTION_INIT_TIMEOUT)
+                if event is None:
+                    return
+                if event.get('type') != 'connection_init':
+                    raise _Close(4401, 'Unauthorized')
+                await self.handle(event)
+            except asyncio.TimeoutError:
+                raise _Close(4408, 'Connection initialisation timeout')
+
+            while True:
+                event = await self.receive_message(receive)
+                if event is None:
+                    return
+                await self.handle(event)
+        except _Close as close:
+            await self._send({'type': 'websocket.close', 'code': close.code, 'reason': close.reason})
+        finally:
+            for task in self.operations.values():
+                task.cancel()
+
+    async def receive_message(self, receive):
+        """The next protocol message, or ``None`` once the client is gone."""
+        event = await receive()
+        if event['type'] == 'websocket.disconnect':
+            return None
+        try:
+            message = json.loads(event.get('text') or event.get('bytes') or '')
+        except ValueError:
+            raise _Close(4400, 'Invalid message received')
+        if not isinstance(message, dict):
+            raise _Close(4400, 'Invalid message received')
+        return message
+
+    async def handle(self, message):
+        kind = message.get('type')
+        if kind == 'connection_init':
+            if self.connection_params is not None:
+                raise _Close(4429, 'Too many initialisation requests')
+            self.connection_params = message.get('payload') or {}
+            await self.send({'type': 'connection_ack'})
+        elif kind == 'ping':
+            await self.send({'type': 'pong'})
+        elif kind == 'pong':
+            pass
+        elif kind == 'subscribe':
+            id, payload = message.get('id'), message.get('payload')
+            if not isinstance(id, str) or not isinstance(payload, dict):
+                raise _Close(4400, 'Invalid message received')
+            if id in self.operations:
+                raise _Close(4409, f'Subscriber for {id} already exists')
+            self.operations[id] = asyncio.create_task(self.operation(id, payload))
+        elif kind == 'complete':
+            task = self.operations.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            raise _Close(4400, 'Invalid message received')
+
+    async def operation(self, id, payload):
+        try:
+            result = await self.execute(payload)
+            if isinstance(result, list):
+                await self.send({'type': 'error', 'id': id, 'payload': [error.formatted for error in result]})
+                return
+            if isinstance(result, ExecutionResult):
+                await self.send({'type': 'next', 'id': id, 'payload': result.formatted})
+            else:
+                try:
+                    async for event in result:
+                        await self.send({'type': 'next', 'id': id, 'payload': event.formatted})
+                except Exception as e:
+                    # The event source failed (e.g. the subscriber overflowed).
+                    await self.send({'type': 'error', 'id': id, 'payload': [{'message': str(e)}]})
+                    return
+                finally:
+                    await result.aclose()
+            await self.send({'type': 'complete', 'id': id})
+        finally:
+            if self.operations.get(id) is asyncio.current_task():
+                del self.operations[id]
+
+    async def execute(self, payload):
+        """Run one operation; a list of errors means it was rejected unexecuted."""
+        query = payload.get('query')
+        try:
+            sha256_hash = persisted_query_hash(payload.get('extensions'))
+            if not query and not sha256_hash:
+                raise GraphQLError('Must provide query string.')
+            document, errors = get_document(self.schema, query, sha256_hash)
+        except GraphQLError as e:
+            return [e]
+        if errors:
+            return errors
+
+        operation_name = payload.get('operationName')
+        variables = payload.get('variables')
+        _, error = check_cost(self.schema.graphql_schema, document, operation_name, variables)
+        if error is not None:
+            return [error]
+
+        operation_ast = get_operation_ast(document, operation_name)
+        options = {
+            'schema': self.schema.graphql_schema,
+            'document': document,
+            'context_value': Context(self.scope, self.connection_params),
+            'variable_values': variables,
+            'operation_name': operation_name,
+        }
+        if operation_ast is not None and operation_ast.operation == OperationType.SUBSCRIPTION:
+            stream = await subscribe(**options)
+            return stream.errors if isinstance(stream, ExecutionResult) else stream
+        result = execute(**options)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
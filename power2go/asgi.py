@@ -13,4 +13,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'power2go.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up. GraphQL subscriptions are served over
+# WebSocket on the same path as the HTTP endpoint.
+from base.websocket import GraphQLWebSocket  # noqa: E402
+
+websocket_application = GraphQLWebSocket()
+WEBSOCKET_PATHS = ('/graphql/', '/graphql/async/')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'] in WEBSOCKET_PATHS:
+            return await websocket_application(scope, receive, send)
+        await receive()
+        return await send({'type': 'websocket.close', 'code': 4404})
+    return await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,8 +56,62 @@ ROOT_URLCONF = 'power2go.urls'
 
 GRAPHENE = {
     'SCHEMA': 'power2go.schema.schema',
+    # The schema has no _debug field, so graphene's DEBUG-only
+    # DjangoDebugMiddleware would only wrap every connection's cursor
+    'MIDDLEWARE': [],
 }
 
+# Connection fields (usersConnectionGql, contractsConnectionGql) page sizes
+GRAPHQL_PAGE_SIZE = 20
+GRAPHQL_MAX_PAGE_SIZE = 100
+
+# Parsed and validated GraphQL documents kept in process memory, and the
+# optional cache alias that shares persisted query texts between processes
+GRAPHQL_DOCUMENT_CACHE_SIZE = 1000
+GRAPHQL_PERSISTED_QUERY_CACHE = None
+
+# Operations accepted in one batched request (a JSON array body)
+GRAPHQL_MAX_BATCH_SIZE = 50
+
+# Static cost analysis (base/cost.py): operations over either budget are
+# rejected before execution. Unbounded lists are costed at their expected
+# size from GRAPHQL_COST_LIST_SIZES, or GRAPHQL_COST_LIST_SIZE by default.
+# The root lists return whole tables, so their sizes track the expected
+# row counts: one flat list fits the budget, one that also joins each
+# row's user (or fans out through aliases) does not
+GRAPHQL_MAX_COST = 50000
+GRAPHQL_MAX_DEPTH = 10
+# Budget for the summed cost of all operations in one batched request
+GRAPHQL_MAX_BATCH_COST = 50000
+GRAPHQL_COST_LIST_SIZE = 1000
+GRAPHQL_COST_LIST_SIZES = {
+    'Query.usersGql': 50000,
+    'Query.contractsGql': 40000,
+    'Query.getContractsByUser': 20,
+    'UserType.contracts': 20,
+}
+GRAPHQL_FIELD_COSTS = {}
+
+# Per-resolver tracing (base/tracing.py): requests with the header get the
+# trace in their extensions; others are traced into /metrics at this rate
+GRAPHQL_TRACE_HEADER = 'X-GraphQL-Trace'
+GRAPHQL_TRACE_SAMPLE_RATE = 0.01
+
+# Subscriptions (base/websocket.py, served by power2go/asgi.py). Mutations
+# publish change events through this backend; LocalBackend only reaches
+# subscribers in the same process, so multi-node deployments plug in one
+# that relays through a broker. Subscribers further behind than the queue
+# size are disconnected
+GRAPHQL_PUBSUB_BACKEND = 'base.pubsub.LocalBackend'
+GRAPHQL_SUBSCRIPTION_QUEUE_SIZE = 1000
+GRAPHQL_WS_CONNECTION_INIT_TIMEOUT = 10
+
+# GraphQL responses of at least this many bytes are compressed for clients
+# that accept it: brotli when the package is installed, gzip otherwise
+GRAPHQL_COMPRESS_MIN_SIZE = 1024
+GRAPHQL_GZIP_LEVEL = 5
+GRAPHQL_BROTLI_QUALITY = 4
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -79,13 +134,64 @@ WSGI_APPLICATION = 'power2go.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# WAL lets readers run while a mutation writes; IMMEDIATE transactions take
+# the write lock up front instead of failing to upgrade a read lock
+SQLITE_INIT_COMMAND = ';'.join([
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA busy_timeout=5000',
+])
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_INIT_COMMAND,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Reads of GraphQL queries (base.db.ReadWriteRouter). Without a replica
+    # file it is a second, read-only connection to the primary
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DATABASE_REPLICA_NAME', os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3')),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_INIT_COMMAND + ';PRAGMA query_only=ON',
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['base.db.ReadWriteRouter']
+DATABASE_READ_REPLICA = 'replica'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Read-through cache for single-entity GraphQL queries (base/result_cache.py)
+GRAPHQL_RESULT_CACHE_ALIAS = 'default'
+GRAPHQL_RESULT_CACHE_TIMEOUT = 300
+GRAPHQL_RESULT_CACHE_MAX_ENTRY_SIZE = 1024 * 1024
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -0,0 +1,26 @@
+"""
+API-only settings for the serverless function.
+
+Extends ``power2go.settings`` but drops everything the GraphQL endpoint does
+not use (admin, auth, sessions, messages, staticfiles, templates, graphiql
+and their middleware), so a cold start loads as little as possible.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'base',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'power2go.urls_api'
+
+TEMPLATES = []
+
+WSGI_APPLICATION = 'power2go.wsgi_api.application'
+
+USE_I18N = False
@@ -1,12 +1,16 @@
 
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
+from base.async_schema import async_schema
 from base.schema import schema 
+from base.views import AsyncGraphQLView, GraphQLView, export_view, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),  
+    path('graphql/async/', csrf_exempt(AsyncGraphQLView.as_view(schema=async_schema))),
+    path('metrics', metrics_view),
+    path('export/<str:resource>', export_view),
 ]
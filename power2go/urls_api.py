@@ -0,0 +1,9 @@
+from django.urls import path
+
+from base.views import GraphQLView
+
+# The schema is given by dotted path so it is only built by the first
+# request, not while the function boots.
+urlpatterns = [
+    path('graphql/', GraphQLView.as_view(schema='base.schema.schema')),
+]
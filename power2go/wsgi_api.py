@@ -0,0 +1,13 @@
+"""
+WSGI config for the API-only serverless function.
+
+Same as ``power2go.wsgi`` but boots ``power2go.settings_api``.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'power2go.settings_api')
+
+application = get_wsgi_application()